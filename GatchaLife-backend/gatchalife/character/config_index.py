@@ -0,0 +1,118 @@
+"""
+Parsed index over CharacterVariant.card_configurations_data.
+
+Shared by card lookups (image generation, card serialization, collection
+previews and the gacha drop table). A variant's configs are parsed and their
+rarity/style/theme names normalized once, memoized per (variant id, updated_at),
+so every save produces a fresh index and stale ones age out of the LRU.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+
+def _normalize(name):
+    return (name or "").strip().lower()
+
+
+class ParsedConfig(NamedTuple):
+    # Position in variant.card_configurations_data
+    index: int
+    rarity: str  # Upper-cased rarity name
+    style: Optional[str]  # Raw style/theme names, as stored
+    theme: Optional[str]
+    legacy: bool
+    pose: str
+    config: dict
+
+
+class CardConfigIndex:
+    def __init__(self, configs):
+        self.entries = []
+        # (RARITY, style name, theme name) -> first config with these exact names
+        self.exact = {}
+        # RARITY -> [ParsedConfig, ...] in declaration order
+        self.by_rarity = {}
+        self._matches = {}
+
+        for index, c in enumerate(configs or []):
+            entry = ParsedConfig(
+                index=index,
+                rarity=(c.get("rarity") or "").upper(),
+                style=(c.get("style") or {}).get("name"),
+                theme=(c.get("theme") or {}).get("name"),
+                legacy=bool(c.get("legacy", False)),
+                pose=c.get("pose", ""),
+                config=c,
+            )
+            self.entries.append(entry)
+            self.exact.setdefault((entry.rarity, entry.style, entry.theme), entry)
+            self.by_rarity.setdefault(entry.rarity, []).append(entry)
+
+    @property
+    def active_entries(self):
+        return [e for e in self.entries if not e.legacy]
+
+    def find(self, rarity_name, style_name, theme_name):
+        """
+        Exact lookup: case-insensitive rarity, style/theme names compared as stored.
+        """
+        return self.exact.get(((rarity_name or "").upper(), style_name, theme_name))
+
+    def match(self, rarity_name, style_name=None, theme_name=None):
+        """
+        Loose lookup used for generation: a config without a style (or theme)
+        accepts any, and names are compared stripped and case-insensitively.
+        """
+        key = ((rarity_name or "").upper(), _normalize(style_name), _normalize(theme_name))
+        if key not in self._matches:
+            self._matches[key] = next(
+                (
+                    e
+                    for e in self.by_rarity.get(key[0], [])
+                    if not (e.style and key[1] and _normalize(e.style) != key[1])
+                    and not (e.theme and key[2] and _normalize(e.theme) != key[2])
+                ),
+                None,
+            )
+        return self._matches[key]
+
+    def pose_for(self, rarity_name, style_name, theme_name):
+        """
+        Pose of the exact config, falling back to the first config of the rarity.
+        """
+        entry = self.find(rarity_name, style_name, theme_name)
+        if entry is None:
+            entry = next(iter(self.by_rarity.get((rarity_name or "").upper(), [])), None)
+        return entry.pose if entry else ""
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_config_index(variant):
+    """
+    Returns the CardConfigIndex for the variant, reusing the cached one while the
+    variant hasn't been saved since.
+    """
+    if variant.pk is None or variant.updated_at is None:
+        return CardConfigIndex(variant.card_configurations_data)
+
+    key = (variant.pk, variant.updated_at)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = CardConfigIndex(variant.card_configurations_data)
+    max_size = getattr(settings, "CARD_CONFIG_INDEX_CACHE_SIZE", 2048)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > max_size:
+            _indexes.popitem(last=False)
+    return index
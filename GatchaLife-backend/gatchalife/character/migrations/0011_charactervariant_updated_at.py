@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('character', '0010_charactervariant_legacy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charactervariant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -96,6 +96,8 @@ class CharacterVariant(models.Model):
         default=list, blank=True, help_text="AI generated card configurations (rarity, pose, theme, style)"
     )
     legacy = models.BooleanField(default=False)
+    # Bumped on every save; keys the parsed card configuration index (config_index.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.character.name} ({self.name})"
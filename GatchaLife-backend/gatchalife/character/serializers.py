@@ -2,13 +2,94 @@ from .models import Character, CharacterVariant, VariantReferenceImage, Series
 from rest_framework import serializers
 
 
+class FieldSelection:
+    """
+    Sparse fieldset requested by a client.
+    `?fields=id,name,variants.name` keeps only the listed fields (dotted paths reach
+    nested serializers). `?expand=` switches to lean mode, where the heavy fields
+    a serializer lists in Meta.deferred_fields are left out unless expanded,
+    e.g. `?expand=variants` or `?expand=variants.card_configurations_data`.
+    """
+
+    def __init__(self, lean=False):
+        self.fields = None  # None: no explicit whitelist
+        self.lean = lean
+        self.expanded = set()
+        self.children = {}
+
+    def keeps(self, name, deferred=()):
+        if self.fields is not None:
+            return name in self.fields or name in self.expanded
+        return not (self.lean and name in deferred) or name in self.expanded
+
+    def child(self, name):
+        if name not in self.children:
+            self.children[name] = FieldSelection(lean=self.lean)
+        return self.children[name]
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        fields = query_params.get("fields")
+        lean = "expand" in query_params
+        if not fields and not lean:
+            return None
+
+        selection = cls(lean=lean)
+        for path in (fields or "").split(","):
+            parts = [p for p in path.strip().split(".") if p]
+            node = selection
+            for part in parts:
+                if node.fields is None:
+                    node.fields = set()
+                node.fields.add(part)
+                node = node.child(part)
+
+        for path in query_params.get("expand", "").split(","):
+            parts = [p for p in path.strip().split(".") if p]
+            node = selection
+            for part in parts:
+                node.expanded.add(part)
+                node = node.child(part)
+        return selection
+
+
+class SparseFieldsetMixin:
+    """
+    Applies a FieldSelection (passed as `field_selection=`) to the serializer
+    and, recursively, to its nested serializers.
+    """
+
+    def __init__(self, *args, field_selection=None, **kwargs):
+        self.field_selection = field_selection
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = getattr(self, "field_selection", None)
+        if selection is None:
+            return fields
+
+        deferred = getattr(self.Meta, "deferred_fields", ())
+        for name in list(fields):
+            if not selection.keeps(name, deferred):
+                fields.pop(name)
+                continue
+
+            nested = getattr(fields[name], "child", fields[name])
+            if isinstance(nested, SparseFieldsetMixin) and (
+                name in selection.children or selection.lean
+            ):
+                nested.field_selection = selection.child(name)
+        return fields
+
+
 class VariantReferenceImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = VariantReferenceImage
         fields = ["id", "image", "variant"]
 
 
-class CharacterVariantSerializer(serializers.ModelSerializer):
+class CharacterVariantSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     images = VariantReferenceImageSerializer(many=True, read_only=True)
 
     class Meta:
@@ -26,9 +107,10 @@ class CharacterVariantSerializer(serializers.ModelSerializer):
             "card_configurations_data",
             "legacy",
         ]
+        deferred_fields = ["images", "card_configurations_data"]
 
 
-class CharacterSerializer(serializers.ModelSerializer):
+class CharacterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     variants = CharacterVariantSerializer(many=True, read_only=True)
     images = VariantReferenceImageSerializer(many=True, read_only=True)
 
@@ -54,6 +136,7 @@ class CharacterSerializer(serializers.ModelSerializer):
             "negative_traits_suggestion",
             "legacy",
         ]
+        deferred_fields = ["variants", "images"]
 
 
 class SeriesSerializer(serializers.ModelSerializer):
@@ -1,8 +1,8 @@
 import logging
-import requests
 from django.conf import settings
 from gatchalife.character.models import Character, CharacterVariant
 from gatchalife.style.models import Theme
+from gatchalife.workflow_engine import n8n
 
 logger = logging.getLogger(__name__)
 
@@ -98,9 +98,9 @@ def trigger_character_profiling(character, wiki_text, callback_url=None):
         # Ideally, N8N webhook node responds 200 OK immediately and continues processing.
 
         if files:
-            requests.post(webhook_url, data=payload, files=files, timeout=5)
+            n8n.post(webhook_url, name="character_profiling", data=payload, files=files)
         else:
-            requests.post(webhook_url, json=payload, timeout=5)
+            n8n.post(webhook_url, name="character_profiling", json=payload)
 
         job.status = AsyncJob.Status.PROCESSING
         job.save()
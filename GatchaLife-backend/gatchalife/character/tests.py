@@ -1,7 +1,8 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from .models import Series, Character, CharacterVariant
+from .config_index import get_config_index
 
 class CharacterTests(TestCase):
     def setUp(self):
@@ -16,6 +17,56 @@ class CharacterTests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['name'], "Test Series")
 
+    def test_list_series_conditional_get(self):
+        response = self.client.get('/series/')
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        response = self.client.get('/series/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Series.objects.create(name="Another Series")
+        response = self.client.get('/series/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_same_second_write_changes_last_modified(self):
+        response = self.client.get('/series/')
+        last_modified = response["Last-Modified"]
+
+        # A write within the same second must not be hidden from If-Modified-Since
+        Series.objects.create(name="Another Series")
+        response = self.client.get('/series/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_list_characters_prefetches_variants(self):
+        for i in range(3):
+            character = Character.objects.create(name=f"Extra {i}", series=self.series)
+            CharacterVariant.objects.create(name="Base", character=character)
+        with self.assertNumQueries(3):
+            response = self.client.get('/characters/')
+        self.assertEqual(len(response.data), 4)
+
+    def test_sparse_fieldsets(self):
+        self.variant.card_configurations_data = [{"rarity": "COMMON"}]
+        self.variant.save()
+
+        response = self.client.get('/characters/?fields=id,name')
+        self.assertEqual(set(response.data[0]), {"id", "name"})
+
+        response = self.client.get('/characters/?fields=id,variants.name')
+        self.assertEqual(response.data[0]["variants"], [{"name": "Base"}])
+
+        response = self.client.get('/characters/?expand=variants')
+        variant = response.data[0]["variants"][0]
+        self.assertIn("description", response.data[0])
+        self.assertNotIn("card_configurations_data", variant)
+
+        response = self.client.get('/variants/?expand=')
+        self.assertNotIn("card_configurations_data", response.data[0])
+        self.assertNotIn("images", response.data[0])
+
     def test_create_character(self):
         payload = {
             "name": "Char 2",
@@ -43,3 +94,60 @@ class CharacterTests(TestCase):
         response = self.client.post('/variants/', payload)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(CharacterVariant.objects.count(), 2)
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=60)
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.series = Series.objects.create(name="Test Series")
+        self.character = Character.objects.create(name="Char 1", series=self.series)
+
+    def test_list_is_cached_until_a_variant_changes(self):
+        response = self.client.get('/characters/')
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get('/characters/')
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data[0]['name'], "Char 1")
+
+        CharacterVariant.objects.create(name="New", character=self.character)
+        response = self.client.get('/characters/')
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data[0]['variants']), 1)
+
+        stats = self.client.get('/cache-stats/').data["character"]
+        self.assertGreaterEqual(stats["hits"], 1)
+        self.assertGreaterEqual(stats["misses"], 2)
+
+
+class CardConfigIndexTests(TestCase):
+    def setUp(self):
+        self.series = Series.objects.create(name="Test Series")
+        self.character = Character.objects.create(name="Char 1", series=self.series)
+        self.variant = CharacterVariant.objects.create(
+            name="Base",
+            character=self.character,
+            card_configurations_data=[
+                {"rarity": "common", "style": {"name": "Anime"}, "theme": {"name": "Forest"}, "pose": "wave"},
+                {"rarity": "COMMON", "pose": "sit"},
+                {"rarity": "RARE", "style": {"name": "Oil"}, "theme": {"name": "Beach"}, "pose": "run", "legacy": True},
+            ],
+        )
+
+    def test_lookups(self):
+        index = get_config_index(self.variant)
+        self.assertEqual(index.find("Common", "Anime", "Forest").pose, "wave")
+        self.assertIsNone(index.find("Common", "anime", "Forest"))
+        self.assertEqual(index.match("Common", " anime ", "FOREST").pose, "wave")
+        # A config without style/theme accepts any
+        self.assertEqual(index.match("Common", "Pixel", "Space").pose, "sit")
+        self.assertEqual(index.pose_for("Common", "Pixel", "Space"), "wave")
+        self.assertEqual([e.pose for e in index.active_entries], ["wave", "sit"])
+
+    def test_index_is_memoized_until_save(self):
+        index = get_config_index(self.variant)
+        self.assertIs(get_config_index(CharacterVariant.objects.get(pk=self.variant.pk)), index)
+
+        self.variant.card_configurations_data = [{"rarity": "RARE", "pose": "jump"}]
+        self.variant.save()
+        self.assertEqual(get_config_index(self.variant).match("Rare").pose, "jump")
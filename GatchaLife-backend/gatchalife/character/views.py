@@ -1,4 +1,3 @@
-import requests
 import logging
 from django.conf import settings
 from rest_framework import viewsets, filters, permissions, status
@@ -13,25 +12,56 @@ from .serializers import (
     SeriesSerializer, 
     CharacterSerializer, 
     CharacterVariantSerializer, 
+    FieldSelection,
     VariantReferenceImageSerializer
 )
+from gatchalife.versioning import CachedListMixin, VersionedConditionalMixin
+from gatchalife.workflow_engine import n8n
 
 logger = logging.getLogger(__name__)
 
 
-class SeriesViewSet(viewsets.ModelViewSet):
+class SeriesViewSet(VersionedConditionalMixin, viewsets.ModelViewSet):
     queryset = Series.objects.all()
     serializer_class = SeriesSerializer
     permission_classes = [permissions.AllowAny]
 
-class CharacterViewSet(viewsets.ModelViewSet):
-    queryset = Character.objects.all()
+class SparseFieldsetViewMixin:
+    """
+    Passes the ?fields= / ?expand= selection of read requests to the serializer.
+    """
+
+    def get_field_selection(self):
+        if self.request is None or self.request.method not in ("GET", "HEAD"):
+            return None
+        return FieldSelection.from_query_params(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("field_selection", self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
+
+
+class CharacterViewSet(
+    VersionedConditionalMixin, CachedListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet
+):
+    queryset = Character.objects.prefetch_related("variants__images")
     serializer_class = CharacterSerializer
     permission_classes = [permissions.AllowAny]
+    cached_models = (Character, CharacterVariant, VariantReferenceImage)
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['series']
     search_fields = ['name']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selection = self.get_field_selection()
+        if selection is not None and not selection.keeps(
+            "variants", CharacterSerializer.Meta.deferred_fields
+        ):
+            # Nested variants aren't rendered, don't prefetch them
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
     def perform_create(self, serializer):
         # 1. Sauvegarde initiale du personnage
         character = serializer.save()
@@ -146,9 +176,9 @@ class CharacterViewSet(viewsets.ModelViewSet):
 
             # Send to n8n (Async trigger)
             if files:
-                requests.post(webhook_url, data=payload, files=files, timeout=5)
+                n8n.post(webhook_url, name="create_variants", data=payload, files=files)
             else:
-                requests.post(webhook_url, json=payload, timeout=5)
+                n8n.post(webhook_url, name="create_variants", json=payload)
 
             job.status = AsyncJob.Status.PROCESSING
             job.save()
@@ -173,10 +203,13 @@ class CharacterViewSet(viewsets.ModelViewSet):
             )
 
 
-class CharacterVariantViewSet(viewsets.ModelViewSet):
-    queryset = CharacterVariant.objects.all()
+class CharacterVariantViewSet(
+    VersionedConditionalMixin, CachedListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet
+):
+    queryset = CharacterVariant.objects.prefetch_related("images")
     serializer_class = CharacterVariantSerializer
     permission_classes = [permissions.AllowAny]
+    cached_models = (CharacterVariant, VariantReferenceImage)
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['character']
 
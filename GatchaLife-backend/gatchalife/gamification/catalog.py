@@ -0,0 +1,65 @@
+"""
+Per-request snapshot of the small catalog tables.
+
+Virtual (unowned) collection cards and previews need series names and
+Rarity/Style/Theme rows for every row they build. The snapshot loads each table
+at most once per request (lazily, on first use) and answers every later lookup
+from dictionaries, so building a row never hits the database.
+"""
+
+from functools import cached_property
+
+from gatchalife.character.models import Series
+from gatchalife.style.models import Rarity, Style, Theme
+
+
+def _first_by(objects, key):
+    """Maps key(obj) -> obj, keeping the first object, like `.filter(...).first()`."""
+    mapping = {}
+    for obj in objects:
+        mapping.setdefault(key(obj), obj)
+    return mapping
+
+
+class CatalogSnapshot:
+    @cached_property
+    def series(self):
+        return {s.id: s for s in Series.objects.all()}
+
+    @cached_property
+    def rarities(self):
+        return {r.id: r for r in Rarity.objects.order_by("pk")}
+
+    @cached_property
+    def styles(self):
+        return {s.id: s for s in Style.objects.order_by("pk")}
+
+    @cached_property
+    def themes(self):
+        return {t.id: t for t in Theme.objects.order_by("pk")}
+
+    @cached_property
+    def _rarities_by_name(self):
+        return _first_by(self.rarities.values(), lambda r: r.name.upper())
+
+    @cached_property
+    def _styles_by_name(self):
+        return _first_by(self.styles.values(), lambda s: s.name)
+
+    @cached_property
+    def _themes_by_name(self):
+        return _first_by(self.themes.values(), lambda t: t.name)
+
+    def series_name(self, character):
+        series = self.series.get(character.series_id)
+        return series.name if series else "Unknown"
+
+    def rarity_named(self, name):
+        # Case-insensitive, like name__iexact
+        return self._rarities_by_name.get((name or "").upper())
+
+    def style_named(self, name):
+        return self._styles_by_name.get(name)
+
+    def theme_named(self, name):
+        return self._themes_by_name.get(name)
@@ -0,0 +1,51 @@
+"""
+Companion image resolution for the tamagotchi endpoint.
+
+The images of a character are loaded once into a state -> URL map kept in the
+Django cache, and the map is dropped whenever one of the character's
+CompanionImage rows is written (see signals.py).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import CompanionImage, CompanionState
+
+COMPANION_IMAGES_KEY = "gatchalife:companion_images:{character_id}"
+
+
+def companion_state(mood, sleeping):
+    if sleeping:
+        return CompanionState.SLEEPING
+    if mood >= 80:
+        return CompanionState.EXTREMELY_HAPPY
+    if mood >= 60:
+        return CompanionState.HAPPY
+    if mood >= 40:
+        return CompanionState.NEUTRAL
+    if mood >= 20:
+        return CompanionState.POUTING
+    if mood > 0:
+        return CompanionState.DISTRESSED
+    return CompanionState.DEAD
+
+
+def companion_image_urls(character_id):
+    """
+    Returns {state: relative image URL} for the character's companion images.
+    """
+    key = COMPANION_IMAGES_KEY.format(character_id=character_id)
+    urls = cache.get(key)
+    if urls is None:
+        urls = {
+            image.state: image.image.url
+            for image in CompanionImage.objects.filter(character_id=character_id).only(
+                "state", "image"
+            )
+        }
+        cache.set(key, urls, timeout=getattr(settings, "COMPANION_IMAGE_CACHE_TIMEOUT", 3600))
+    return urls
+
+
+def invalidate_companion_images(character_id):
+    cache.delete(COMPANION_IMAGES_KEY.format(character_id=character_id))
@@ -0,0 +1,196 @@
+"""
+Compiled gacha drop table.
+
+Compiled once per catalog version: each rarity maps to a flat list of
+DropEntry tuples whose Style/Theme foreign keys are already resolved, so a pull
+is a single random.choice().
+
+The version token lives in the Django cache so that a catalog write in one
+worker invalidates the compiled table in every worker sharing that cache.
+"""
+
+import random
+import threading
+import uuid
+from typing import NamedTuple, Optional
+
+import structlog
+from django.conf import settings
+from django.core.cache import cache
+
+from gatchalife.character.config_index import get_config_index
+from gatchalife.character.models import CharacterVariant
+from gatchalife.style.models import Rarity, Style, Theme
+
+logger = structlog.get_logger(__name__)
+
+DROP_TABLE_VERSION_KEY = "gamification:drop_table:version"
+
+
+class DropEntry(NamedTuple):
+    variant_id: int
+    # Index into variant.card_configurations_data, None when the variant has no usable config
+    config_index: Optional[int]
+    style_id: Optional[int]
+    theme_id: Optional[int]
+
+
+class DropTable:
+    def __init__(self, version, rarities, variants, styles, themes, entries, fallback):
+        self.version = version
+        # Ordered by descending min_roll_threshold
+        self.rarities = rarities
+        self.variants = variants
+        self.styles = styles
+        self.themes = themes
+        # rarity_id -> [DropEntry, ...]
+        self.entries = entries
+        # rarity_id -> [[DropEntry, ...] per variant]
+        self.fallback = fallback
+
+    def pick_rarity(self, final_roll):
+        for r in self.rarities:
+            if final_roll >= r.min_roll_threshold:
+                return r
+        return self.rarities[-1] if self.rarities else None
+
+    def sample(self, rarity):
+        """
+        Picks a random DropEntry for the given rarity.
+        Falls back to any variant (then any of its configs) when no configuration
+        matches the rarity, mirroring the historical roll behaviour.
+        """
+        entries = self.entries.get(rarity.id)
+        if entries:
+            return random.choice(entries)
+
+        per_variant = self.fallback.get(rarity.id)
+        if not per_variant:
+            return None
+        return random.choice(random.choice(per_variant))
+
+    def config_for(self, entry):
+        if entry.config_index is None:
+            return {}
+        variant = self.variants[entry.variant_id]
+        return (variant.card_configurations_data or [])[entry.config_index]
+
+
+def build_drop_table(version=None):
+    rarities = list(Rarity.objects.order_by("-min_roll_threshold"))
+    variants = {
+        v.id: v
+        for v in CharacterVariant.objects.filter(
+            character__legacy=False, legacy=False
+        ).select_related("character")
+    }
+    styles = {s.id: s for s in Style.objects.order_by("pk")}
+    themes = {t.id: t for t in Theme.objects.order_by("pk")}
+
+    # Lookup maps reproducing the `.filter(...).first()` resolution order (lowest pk wins)
+    style_by_name_rarity = {}
+    style_by_name = {}
+    style_by_rarity = {}
+    for s in styles.values():
+        style_by_name_rarity.setdefault((s.name, s.rarity_id), s.id)
+        style_by_name.setdefault(s.name, s.id)
+        style_by_rarity.setdefault(s.rarity_id, s.id)
+    first_style_id = next(iter(styles), None)
+
+    theme_by_name = {}
+    for t in themes.values():
+        theme_by_name.setdefault(t.name, t.id)
+    first_theme_id = next(iter(themes), None)
+
+    def resolve_style(style_name, rarity_id):
+        style_id = None
+        if style_name:
+            style_id = style_by_name_rarity.get((style_name, rarity_id)) or style_by_name.get(
+                style_name
+            )
+        return style_id or style_by_rarity.get(rarity_id) or first_style_id
+
+    def resolve_theme(theme_name):
+        theme_id = theme_by_name.get(theme_name) if theme_name else None
+        return theme_id or first_theme_id
+
+    # Active (non-legacy) configs per variant, with their original index
+    active_configs = {
+        variant_id: get_config_index(v).active_entries for variant_id, v in variants.items()
+    }
+
+    entries = {}
+    fallback = {}
+    for r in rarities:
+        rarity_key = r.name.upper()
+        rarity_entries = []
+        rarity_fallback = []
+
+        for variant_id, configs in active_configs.items():
+            variant_fallback = []
+            for c in configs:
+                entry = DropEntry(
+                    variant_id,
+                    c.index,
+                    resolve_style(c.style, r.id),
+                    resolve_theme(c.theme),
+                )
+                if c.rarity == rarity_key:
+                    rarity_entries.append(entry)
+                variant_fallback.append(entry)
+
+            if not variant_fallback:
+                variant_fallback.append(
+                    DropEntry(variant_id, None, resolve_style(None, r.id), resolve_theme(None))
+                )
+            rarity_fallback.append(variant_fallback)
+
+        entries[r.id] = rarity_entries
+        fallback[r.id] = rarity_fallback
+
+    logger.info(
+        "drop_table_compiled",
+        version=version,
+        variants=len(variants),
+        entries=sum(len(e) for e in entries.values()),
+    )
+
+    return DropTable(version, rarities, variants, styles, themes, entries, fallback)
+
+
+_compiled = None
+_lock = threading.Lock()
+
+
+def _version_timeout():
+    # Finite, so a missed invalidation is recovered from by a rebuild
+    return getattr(settings, "CACHE_VERSION_TIMEOUT", 300)
+
+
+def get_drop_table_version():
+    version = cache.get(DROP_TABLE_VERSION_KEY)
+    if version is None:
+        cache.add(DROP_TABLE_VERSION_KEY, uuid.uuid4().hex, timeout=_version_timeout())
+        version = cache.get(DROP_TABLE_VERSION_KEY)
+    return version
+
+
+def get_drop_table():
+    """
+    Returns the compiled drop table, rebuilding it if the catalog version moved.
+    """
+    global _compiled
+
+    version = get_drop_table_version()
+    table = _compiled
+    if table is not None and table.version == version:
+        return table
+
+    with _lock:
+        if _compiled is None or _compiled.version != version:
+            _compiled = build_drop_table(version)
+        return _compiled
+
+
+def invalidate_drop_table():
+    cache.set(DROP_TABLE_VERSION_KEY, uuid.uuid4().hex, timeout=_version_timeout())
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0010_remove_activetamagotchi_feeds_today_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activetamagotchi',
+            name='timezone',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
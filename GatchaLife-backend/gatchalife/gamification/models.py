@@ -91,6 +91,9 @@ class ActiveTamagotchi(models.Model):
     # Sleep window configuration (24h format)
     sleep_start_hour = models.IntegerField(default=23)  # 11 PM
     sleep_end_hour = models.IntegerField(default=7)  # 7 AM
+    # IANA name (e.g. "Europe/Paris") the sleep and meal windows are read in.
+    # Empty means the server's TIME_ZONE.
+    timezone = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"{self.name} ({self.player.user.username})"
@@ -0,0 +1,48 @@
+"""
+Tamagotchi mood decay.
+
+By default Celery beat persists the decay every 10 minutes (tasks.update_tamagotchi_stats).
+With TAMAGOTCHI_LAZY_DECAY enabled nothing is written periodically: the mood shown
+is derived at read time from the stored mood, last_decay_update and the pet's
+schedule (see schedule.py), and it is only persisted (settled) when an interaction
+changes it.
+"""
+
+from django.conf import settings
+from django.utils import timezone
+
+from .schedule import get_schedule
+
+# 0.7 every 10 minutes -> ~100 points in 24h
+MOOD_DECAY_PER_TICK = 0.7
+DECAY_TICK_SECONDS = 10 * 60
+
+
+def lazy_decay_enabled():
+    return getattr(settings, "TAMAGOTCHI_LAZY_DECAY", False)
+
+
+def current_mood(pet, now=None):
+    """
+    Returns the mood as of `now`, including decay accrued since the last write
+    when lazy decay is enabled.
+    """
+    if not lazy_decay_enabled() or pet.mood <= 0 or pet.last_decay_update is None:
+        return pet.mood
+
+    now = now or timezone.now()
+    awake = get_schedule(pet).awake_seconds_between(pet.last_decay_update, now)
+    return max(0.0, pet.mood - MOOD_DECAY_PER_TICK * awake / DECAY_TICK_SECONDS)
+
+
+def settle_mood(pet, now=None):
+    """
+    Folds the accrued (lazy) decay into the stored mood before an interaction
+    changes it. The caller saves the pet.
+    """
+    if not lazy_decay_enabled():
+        return pet
+    now = now or timezone.now()
+    pet.mood = current_mood(pet, now)
+    pet.last_decay_update = now
+    return pet
@@ -0,0 +1,35 @@
+import base64
+
+from rest_framework.pagination import PageNumberPagination
+
+# Default page size of the keyset (?cursor=) catalog listing
+CATALOG_PAGE_SIZE = 50
+
+
+class CollectionPagination(PageNumberPagination):
+    """
+    Opt-in page-number pagination for the collection: responses stay a plain list
+    unless the client asks for ?page_size=N (and optionally ?page=M).
+    """
+
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+def encode_catalog_cursor(series_key, character_id, variant_id, config_index):
+    raw = f"{series_key}:{character_id}:{variant_id}:{config_index}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_catalog_cursor(cursor):
+    """
+    Returns the (series_key, character_id, variant_id, config_index) keyset position.
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        series_key, character_id, variant_id, config_index = (int(part) for part in raw.split(":"))
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return series_key, character_id, variant_id, config_index
@@ -0,0 +1,154 @@
+"""
+Daily schedule of a companion: sleep window and meal windows, in the pet's timezone.
+
+The decay task, the tamagotchi actions and the serializer all ask the same
+PetSchedule whether a pet is sleeping or which meal it can have, so they compare
+the same local hour. A schedule is compiled once per (timezone, sleep_start_hour,
+sleep_end_hour) into per-hour tables, including the hours left until the next
+sleep/wake transition, and shared by every pet with that configuration.
+"""
+
+import datetime
+import zoneinfo
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+BREAKFAST = "Breakfast"
+LUNCH = "Lunch"
+DINNER = "Dinner"
+
+LUNCH_HOUR = 12
+DINNER_HOUR = 18
+
+
+def is_valid_timezone(name):
+    try:
+        zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def resolve_timezone_name(name):
+    """An empty or unknown pet timezone falls back to the server's TIME_ZONE."""
+    if name and is_valid_timezone(name):
+        return name
+    return settings.TIME_ZONE
+
+
+def get_zone(name):
+    return zoneinfo.ZoneInfo(resolve_timezone_name(name))
+
+
+class PetSchedule:
+    def __init__(self, tz_name, sleep_start_hour, sleep_end_hour):
+        self.tz_name = tz_name
+        self.tz = zoneinfo.ZoneInfo(tz_name)
+        self.sleep_start_hour = sleep_start_hour
+        self.sleep_end_hour = sleep_end_hour
+
+        # Local hour -> sleeping?
+        self.sleeping = tuple(self._is_sleeping_hour(h) for h in range(24))
+        self.awake_hours_per_day = self.sleeping.count(False)
+        # Local hour -> meal name (None outside meal windows)
+        self.meals = self._compile_meals()
+        # Local hour -> hours until the sleeping state flips (None if it never does)
+        self.hours_to_transition = tuple(self._hours_to_transition(h) for h in range(24))
+        # Local hour -> hours since its meal window opened
+        self.hours_into_meal = tuple(self._hours_into_meal(h) for h in range(24))
+
+    def _is_sleeping_hour(self, hour):
+        # Handle wrapping (e.g. 23 to 7)
+        if self.sleep_start_hour > self.sleep_end_hour:
+            return hour >= self.sleep_start_hour or hour < self.sleep_end_hour
+        return self.sleep_start_hour <= hour < self.sleep_end_hour
+
+    def _compile_meals(self):
+        # Window 1: Sleep End -> 12 (Breakfast)
+        # Window 2: 12 -> 18 (Lunch)
+        # Window 3: 18 -> Sleep Start (Dinner)
+        meals = [None] * 24
+        for hour in range(24):
+            if self.sleeping[hour]:
+                continue
+            if self.sleep_end_hour <= hour < LUNCH_HOUR:
+                meals[hour] = BREAKFAST
+            elif LUNCH_HOUR <= hour < DINNER_HOUR:
+                meals[hour] = LUNCH
+            elif hour >= DINNER_HOUR:
+                meals[hour] = DINNER
+        # If sleep start is late (e.g. 1am), dinner runs past midnight until bedtime
+        for hour in range(LUNCH_HOUR):
+            if meals[hour] is None and not self.sleeping[hour] and meals[hour - 1] == DINNER:
+                meals[hour] = DINNER
+        return tuple(meals)
+
+    def _hours_to_transition(self, hour):
+        for ahead in range(1, 25):
+            if self.sleeping[(hour + ahead) % 24] != self.sleeping[hour]:
+                return ahead
+        return None
+
+    def _hours_into_meal(self, hour):
+        back = 0
+        while back < 23 and self.meals[(hour - back - 1) % 24] == self.meals[hour]:
+            back += 1
+        return back
+
+    def localtime(self, when=None):
+        return timezone.localtime(when or timezone.now(), self.tz)
+
+    def _hour_start(self, when):
+        local = self.localtime(when)
+        return local, local.replace(minute=0, second=0, microsecond=0)
+
+    def is_sleeping(self, when=None):
+        return self.sleeping[self.localtime(when).hour]
+
+    def meal_window(self, when=None):
+        return self.meals[self.localtime(when).hour]
+
+    def meal_window_opened_at(self, when=None):
+        """Start of the meal window containing `when` (None outside meal windows)."""
+        local, hour_start = self._hour_start(when)
+        if self.meals[local.hour] is None:
+            return None
+        return hour_start - datetime.timedelta(hours=self.hours_into_meal[local.hour])
+
+    def next_transition(self, when=None):
+        """When the pet next falls asleep or wakes up (None if it never sleeps)."""
+        local, hour_start = self._hour_start(when)
+        ahead = self.hours_to_transition[local.hour]
+        if ahead is None:
+            return None
+        return hour_start + datetime.timedelta(hours=ahead)
+
+    def awake_seconds_between(self, start, end):
+        """Seconds between `start` and `end` spent outside the sleep window."""
+        if end <= start:
+            return 0.0
+
+        full_days = (end - start) // datetime.timedelta(days=1)
+        total = full_days * self.awake_hours_per_day * 3600.0
+
+        current = start + datetime.timedelta(days=full_days)
+        while current < end:
+            change = self.next_transition(current)
+            segment_end = end if change is None else min(change, end)
+            if not self.is_sleeping(current):
+                total += (segment_end - current).total_seconds()
+            current = segment_end
+        return total
+
+
+@lru_cache(maxsize=256)
+def _compile(tz_name, sleep_start_hour, sleep_end_hour):
+    return PetSchedule(tz_name, sleep_start_hour, sleep_end_hour)
+
+
+def get_schedule(pet):
+    return _compile(
+        resolve_timezone_name(pet.timezone), pet.sleep_start_hour, pet.sleep_end_hour
+    )
@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     Player,
@@ -9,7 +10,11 @@ from .models import (
     CompanionImage,
 )
 # Removed unused imports
-from gatchalife.generated_image.services import match_card_configuration
+from gatchalife.character.config_index import get_config_index
+from gatchalife.generated_image.services import latest_image_map, match_card_configuration
+from .companion import companion_image_urls, companion_state
+from .mood import current_mood
+from .schedule import get_schedule, is_valid_timezone
 
 class CompanionImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -50,6 +55,8 @@ class CardSerializer(serializers.ModelSerializer):
     description = serializers.CharField(source='character_variant.description', read_only=True)
     is_archived = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    placeholder = serializers.SerializerMethodField()
 
     class Meta:
         model = Card
@@ -71,6 +78,8 @@ class CardSerializer(serializers.ModelSerializer):
             "description",
             "is_archived",
             "thumbnail_url",
+            "srcset",
+            "placeholder",
         ]
 
     def get_is_archived(self, obj):
@@ -88,107 +97,60 @@ class CardSerializer(serializers.ModelSerializer):
             or is_config_legacy
         )
 
-    def get_image_url(self, obj):
-        # Update to handle the new dict structure in image_map
+    def _image_data(self, obj):
+        """
+        Resolves the latest image of the card's (variant, rarity, style, theme).
+        Views serializing many cards pass a prefetched `image_map` in context
+        (see latest_image_map); otherwise a single indexed query is made per card
+        and shared between image_url and thumbnail_url.
+        """
+        key = (obj.character_variant_id, obj.rarity_id, obj.style_id, obj.theme_id)
         image_map = self.context.get("image_map")
-        if image_map:
-            key = (obj.character_variant_id, obj.rarity_id, obj.style_id, obj.theme_id)
-            data = image_map.get(key)
-            if data:
-                url = data.get("image_url")
-                request = self.context.get("request")
-                if request and url:
-                    return request.build_absolute_uri(url)
-                return url
-            return None
-
-        # Fallback to single query (slow)
-        from gatchalife.generated_image.models import GeneratedImage
+        if image_map is None:
+            if not hasattr(self, "_fallback_images"):
+                self._fallback_images = {}
+            if key not in self._fallback_images:
+                self._fallback_images[key] = latest_image_map([key]).get(key)
+            return self._fallback_images[key]
+        return image_map.get(key)
+
+    def _absolute_url(self, url):
+        request = self.context.get("request")
+        if request and url:
+            return request.build_absolute_uri(url)
+        return url
 
-        image = (
-            GeneratedImage.objects.filter(
-                character_variant_id=obj.character_variant_id,
-                rarity_id=obj.rarity_id,
-                style_id=obj.style_id,
-                theme_id=obj.theme_id,
-            )
-            .order_by("-created_at")
-            .first()
-        )
-
-        if image:
-            try:
-                if not image.image:
-                    return None
-                url = image.image.url
-                request = self.context.get("request")
-                if request:
-                    return request.build_absolute_uri(url)
-                return url
-            except ValueError:
-                return None
-        return None
+    def get_image_url(self, obj):
+        data = self._image_data(obj)
+        return self._absolute_url(data.get("image_url")) if data else None
 
     def get_thumbnail_url(self, obj):
-        # New method for thumbnail
-        image_map = self.context.get("image_map")
-        if image_map:
-            key = (obj.character_variant_id, obj.rarity_id, obj.style_id, obj.theme_id)
-            data = image_map.get(key)
-            if data:
-                url = data.get("thumbnail_url")
-                request = self.context.get("request")
-                if request and url:
-                    return request.build_absolute_uri(url)
-                return url
-            return None
-
-        # Fallback logic for single object
-        from gatchalife.generated_image.models import GeneratedImage
-
-        image = (
-            GeneratedImage.objects.filter(
-                character_variant_id=obj.character_variant_id,
-                rarity_id=obj.rarity_id,
-                style_id=obj.style_id,
-                theme_id=obj.theme_id,
-            )
-            .order_by("-created_at")
-            .first()
-        )
-
-        if image:
-            # Return thumbnail if exists, else full image
-            target_field = image.thumbnail if image.thumbnail else image.image
-            if not target_field:
-                return None
-            url = target_field.url
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(url)
-            return url
-        return None
+        data = self._image_data(obj)
+        return self._absolute_url(data.get("thumbnail_url")) if data else None
+
+    def get_placeholder(self, obj):
+        # Inline data URI, painted before any image request is made
+        data = self._image_data(obj)
+        return data.get("placeholder") if data else None
+
+    def get_srcset(self, obj):
+        """
+        {format: "url 150w, url 300w, ..."} of the image's renditions, e.g. for
+        <picture><source type="image/webp" srcset="...">. Empty until rendered.
+        """
+        data = self._image_data(obj)
+        if not data:
+            return {}
+        return {
+            fmt: ", ".join(f"{self._absolute_url(url)} {width}w" for url, width in candidates)
+            for fmt, candidates in data["renditions"].items()
+        }
 
     def get_pose(self, obj):
-        # Infer pose from matching config in variant
-        configs = obj.character_variant.card_configurations_data
-        # Match by Rarity AND Style AND Theme to be precise
-        # (Assuming V/R/S/T uniqueness holds as fixed in previous step)
-        for config in configs:
-            c_rarity = config.get("rarity", "").upper()
-            c_style = config.get("style", {}).get("name")
-            c_theme = config.get("theme", {}).get("name")
-            
-            if (c_rarity == obj.rarity.name.upper() and
-                c_style == obj.style.name and
-                c_theme == obj.theme.name):
-                return config.get("pose", "")
-        
-        # Fallback: loose match or first matching rarity
-        for config in configs:
-            if config.get("rarity", "").upper() == obj.rarity.name.upper():
-                 return config.get("pose", "")
-        return ""
+        # Infer pose from the exact (rarity, style, theme) config, else the first of the rarity
+        return get_config_index(obj.character_variant).pose_for(
+            obj.rarity.name, obj.style.name, obj.theme.name
+        )
 
 class UserCardSerializer(serializers.ModelSerializer):
     card = CardSerializer(read_only=True)
@@ -215,6 +177,7 @@ class ActiveTamagotchiSerializer(serializers.ModelSerializer):
             "last_decay_update",
             "sleep_start_hour",
             "sleep_end_hour",
+            "timezone",
             "character_id",
             "character_image",
             "character_name",
@@ -222,53 +185,44 @@ class ActiveTamagotchiSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["last_decay_update", "name"]
 
-    def get_is_sleeping(self, obj):
-        from django.utils import timezone
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Includes decay accrued since the last write in lazy decay mode
+        data["mood"] = self._status(instance)[1]
+        return data
+
+    def validate_timezone(self, value):
+        if value and not is_valid_timezone(value):
+            raise serializers.ValidationError(f"Unknown timezone: {value}")
+        return value
+
+    def _status(self, obj):
+        """
+        (sleeping, mood) of the pet, evaluated once per object and shared by
+        is_sleeping, mood and character_image.
+        """
+        if not hasattr(self, "_statuses"):
+            self._statuses = {}
+        if obj.pk not in self._statuses:
+            now = timezone.now()
+            self._statuses[obj.pk] = (get_schedule(obj).is_sleeping(now), current_mood(obj, now))
+        return self._statuses[obj.pk]
 
-        now_hour = timezone.localtime().hour
-        if obj.sleep_start_hour > obj.sleep_end_hour:
-            return now_hour >= obj.sleep_start_hour or now_hour < obj.sleep_end_hour
-        else:
-            return obj.sleep_start_hour <= now_hour < obj.sleep_end_hour
+    def get_is_sleeping(self, obj):
+        return self._status(obj)[0]
 
     def get_character_image(self, obj):
-        from .models import CompanionImage, CompanionState
-
-        # Determine current state
-        if self.get_is_sleeping(obj):
-            current_state = CompanionState.SLEEPING
-        else:
-            # Map mood to state
-            mood = obj.mood
-            if mood >= 80:
-                current_state = CompanionState.EXTREMELY_HAPPY
-            elif mood >= 60:
-                current_state = CompanionState.HAPPY
-            elif mood >= 40:
-                current_state = CompanionState.NEUTRAL
-            elif mood >= 20:
-                current_state = CompanionState.POUTING
-            elif mood > 0:
-                current_state = CompanionState.DISTRESSED
-            else:
-                current_state = CompanionState.DEAD
-
-        # Find image for state
-        mood_image = CompanionImage.objects.filter(
-            character=obj.character, state=current_state
-        ).first()
+        if obj.character_id is None:
+            return None
 
-        # If we have a mood image, use it
-        target_image = None
-        if mood_image:
-            target_image = mood_image.image
-        # Fallback to character face if no mood image (unless DEAD or generic fallback needed?)
-        elif obj.character and obj.character.identity_face_image:
-            target_image = obj.character.identity_face_image
+        sleeping, mood = self._status(obj)
+        url = companion_image_urls(obj.character_id).get(companion_state(mood, sleeping))
+        # Fallback to character face if no mood image
+        if url is None and obj.character.identity_face_image:
+            url = obj.character.identity_face_image.url
 
-        if target_image:
+        if url:
             request = self.context.get("request")
-            url = target_image.url
             if request:
                 return request.build_absolute_uri(url)
             return url
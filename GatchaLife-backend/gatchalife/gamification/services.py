@@ -0,0 +1,191 @@
+import random
+from collections import Counter
+
+import structlog
+from django.db import transaction
+
+from gatchalife.generated_image.models import GeneratedImage
+from gatchalife.versioning import COLLECTION, bump_version
+from .models import Card, UserCard
+
+logger = structlog.get_logger(__name__)
+
+ROLL_COST = 100
+PULLS_PER_ROLL = 5
+
+
+def _key_filters(keys):
+    """
+    Builds IN filters narrowing a query to the (variant, rarity, style, theme) keys.
+    The exact tuple match is done in Python on the (small) result set.
+    """
+    return {
+        "character_variant_id__in": {k[0] for k in keys},
+        "rarity_id__in": {k[1] for k in keys},
+        "style_id__in": {k[2] for k in keys},
+        "theme_id__in": {k[3] for k in keys},
+    }
+
+
+def draw_drops(player, drop_table, pulls=PULLS_PER_ROLL):
+    """
+    Draws `pulls` cards from the compiled drop table.
+    Candidates are drawn in batches; archived (legacy) Cards are filtered out with a
+    single query per batch and redrawn, so the query count does not grow with pulls.
+    """
+    max_attempts = pulls * 4  # Safety break
+    attempts = 0
+    drops = []
+
+    while len(drops) < pulls and attempts < max_attempts:
+        batch = []
+        while len(drops) + len(batch) < pulls and attempts < max_attempts:
+            attempts += 1
+            base_roll = random.randint(1, 100)
+            level_bonus = min(player.level * 0.5, 20.0)
+            final_roll = min(base_roll + level_bonus, 100)
+
+            selected_rarity = drop_table.pick_rarity(final_roll)
+            entry = drop_table.sample(selected_rarity)
+            if entry is None:
+                continue
+
+            target_config = drop_table.config_for(entry)
+            batch.append(
+                {
+                    "key": (entry.variant_id, selected_rarity.id, entry.style_id, entry.theme_id),
+                    "variant": drop_table.variants[entry.variant_id],
+                    "rarity": selected_rarity,
+                    "style": drop_table.styles.get(entry.style_id),
+                    "theme": drop_table.themes.get(entry.theme_id),
+                    "pose": target_config.get("pose", ""),
+                    "card_configuration": target_config,  # Pass full config
+                    "roll_info": {
+                        "base_roll": base_roll,
+                        "level_bonus": level_bonus,
+                        "final_roll": final_roll,
+                        "rarity": selected_rarity.name,
+                    },
+                }
+            )
+
+        if not batch:
+            break
+
+        # Check if any drawn combination is archived (legacy)
+        batch_keys = {d["key"] for d in batch}
+        legacy_keys = {
+            key
+            for key in Card.objects.filter(
+                legacy=True, **_key_filters(batch_keys)
+            ).values_list("character_variant_id", "rarity_id", "style_id", "theme_id")
+            if key in batch_keys
+        }
+
+        for d in batch:
+            if d["key"] in legacy_keys:
+                logger.info("Skipping legacy card drop", key=d["key"])
+                continue
+            drops.append(d)
+
+    return drops
+
+
+def find_missing_images(drops):
+    """
+    Returns the deduplicated (variant, rarity, style, theme, config) combinations
+    that have no GeneratedImage yet, using a single query.
+    We keep the first encountered configuration for any given key.
+    """
+    tasks_map = {}
+    for d in drops:
+        tasks_map.setdefault(d["key"], d)
+
+    if not tasks_map:
+        return []
+
+    existing_keys = set(
+        GeneratedImage.objects.filter(**_key_filters(tasks_map))
+        .values_list("character_variant_id", "rarity_id", "style_id", "theme_id")
+        .distinct()
+    )
+
+    return [
+        (d["variant"], d["rarity"], d["style"], d["theme"], d["card_configuration"])
+        for key, d in tasks_map.items()
+        if key not in existing_keys
+    ]
+
+
+def grant_drops(player, drops):
+    """
+    Creates the Cards and UserCards for the given drops with bulk writes.
+    Returns one (user_card, is_new, count) tuple per drop, where `count` is the
+    number of copies owned right after that drop.
+    """
+    if not drops:
+        return []
+
+    keys = list(dict.fromkeys(d["key"] for d in drops))
+
+    with transaction.atomic():
+        Card.objects.bulk_create(
+            [
+                Card(
+                    character_variant_id=v_id,
+                    rarity_id=r_id,
+                    style_id=s_id,
+                    theme_id=t_id,
+                )
+                for (v_id, r_id, s_id, t_id) in keys
+            ],
+            ignore_conflicts=True,
+        )
+        cards = {
+            (c.character_variant_id, c.rarity_id, c.style_id, c.theme_id): c
+            for c in Card.objects.filter(**_key_filters(keys)).select_related(
+                "character_variant__character__series",
+                "rarity",
+                "style",
+                "theme",
+            )
+        }
+
+        pulls_per_card = Counter(cards[d["key"]].id for d in drops)
+        user_cards = {
+            uc.card_id: uc
+            for uc in UserCard.objects.select_for_update().filter(
+                player=player, card_id__in=pulls_per_card.keys()
+            )
+        }
+        previous_counts = {card_id: uc.count for card_id, uc in user_cards.items()}
+
+        new_user_cards = []
+        for key in keys:
+            card = cards[key]
+            if card.id in user_cards:
+                user_cards[card.id].count += pulls_per_card[card.id]
+            else:
+                uc = UserCard(player=player, card=card, count=pulls_per_card[card.id])
+                user_cards[card.id] = uc
+                new_user_cards.append(uc)
+
+        UserCard.objects.bulk_create(new_user_cards)
+        UserCard.objects.bulk_update(
+            [uc for card_id, uc in user_cards.items() if card_id in previous_counts],
+            ["count"],
+        )
+        # bulk writes don't send post_save
+        transaction.on_commit(lambda: bump_version(COLLECTION))
+
+    results = []
+    running_counts = dict(previous_counts)
+    for d in drops:
+        card = cards[d["key"]]
+        user_card = user_cards[card.id]
+        user_card.card = card
+        count = running_counts.get(card.id, 0) + 1
+        running_counts[card.id] = count
+        results.append((user_card, count == 1, count))
+
+    return results
@@ -0,0 +1,75 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from gatchalife.character.models import Character, CharacterVariant, Series, VariantReferenceImage
+from gatchalife.generated_image.models import GeneratedImage
+from gatchalife.style.models import Rarity, Style, Theme
+from gatchalife.versioning import CATALOG, COLLECTION, connect_version_signals, model_scope
+from .companion import invalidate_companion_images
+from .drop_table import invalidate_drop_table
+from .models import Card, CompanionImage, UserCard
+
+# Any write to these models may change which cards can drop
+DROP_TABLE_MODELS = (Character, CharacterVariant, Rarity, Style, Theme)
+
+# Versions behind the ETags of the catalog and collection endpoints.
+# Bulk writes (see services.grant_drops) bump COLLECTION explicitly.
+CATALOG_MODELS = (Series, Character, CharacterVariant, VariantReferenceImage, Rarity, Style, Theme)
+COLLECTION_MODELS = (Card, UserCard, GeneratedImage)
+
+
+def invalidate_drop_table_on_catalog_change(sender, **kwargs):
+    invalidate_drop_table()
+
+
+for model in DROP_TABLE_MODELS:
+    post_save.connect(
+        invalidate_drop_table_on_catalog_change,
+        sender=model,
+        dispatch_uid=f"drop_table_save_{model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_drop_table_on_catalog_change,
+        sender=model,
+        dispatch_uid=f"drop_table_delete_{model.__name__}",
+    )
+
+
+def remember_companion_image_character(sender, instance, **kwargs):
+    # An image moved to another character must also leave the old one's map
+    instance._previous_character_id = (
+        CompanionImage.objects.filter(pk=instance.pk).values_list("character_id", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+def invalidate_companion_images_on_change(sender, instance, **kwargs):
+    invalidate_companion_images(instance.character_id)
+    previous = getattr(instance, "_previous_character_id", None)
+    if previous is not None and previous != instance.character_id:
+        invalidate_companion_images(previous)
+
+
+pre_save.connect(
+    remember_companion_image_character,
+    sender=CompanionImage,
+    dispatch_uid="companion_images_pre_save",
+)
+post_save.connect(
+    invalidate_companion_images_on_change,
+    sender=CompanionImage,
+    dispatch_uid="companion_images_save",
+)
+post_delete.connect(
+    invalidate_companion_images_on_change,
+    sender=CompanionImage,
+    dispatch_uid="companion_images_delete",
+)
+
+
+connect_version_signals(CATALOG, CATALOG_MODELS)
+connect_version_signals(COLLECTION, COLLECTION_MODELS)
+
+# Per-model versions key the server-side catalog list cache (CachedListMixin)
+for model in CATALOG_MODELS:
+    connect_version_signals(model_scope(model), [model])
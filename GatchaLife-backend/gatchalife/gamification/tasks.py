@@ -1,60 +1,65 @@
 from celery import shared_task
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from .models import ActiveTamagotchi
+from .mood import MOOD_DECAY_PER_TICK, lazy_decay_enabled
+from .schedule import get_zone
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+
+def awake_at(hour):
+    """
+    Q matching pets whose sleep window (24h format) does not contain `hour`.
+    Handles wrapping windows (e.g. 23 to 7: sleeping if hour >= 23 OR hour < 7).
+    """
+    wrapping = Q(sleep_start_hour__gt=F("sleep_end_hour"))
+    return (wrapping & Q(sleep_start_hour__gt=hour, sleep_end_hour__lte=hour)) | (
+        ~wrapping & (Q(sleep_start_hour__gt=hour) | Q(sleep_end_hour__lte=hour))
+    )
+
+
+def awake_now(now, zones):
+    """
+    Q matching pets that are awake at `now` in their own timezone. Pets are grouped
+    by the local hour of their timezone, so the filter has one branch per distinct
+    hour rather than one per pet.
+    """
+    zones_by_hour = {}
+    for name in zones:
+        hour = timezone.localtime(now, get_zone(name)).hour
+        zones_by_hour.setdefault(hour, []).append(name)
+
+    condition = Q(pk__in=[])
+    for hour, names in zones_by_hour.items():
+        condition |= Q(timezone__in=names) & awake_at(hour)
+    return condition
+
+
 @shared_task
 def update_tamagotchi_stats():
     """
-    Decays mood and satiety for all active tamagotchis.
+    Decays mood for all active tamagotchis.
     Runs every 10 minutes (0.7 decay -> ~100 points in 24h).
-    Respects sleep window (no decay if sleeping).
+    Respects sleep window (no decay if sleeping), read in each pet's timezone.
+
+    Only pets whose mood actually changes (alive and awake) are selected, and the
+    sleep check and the decay are a single set-based UPDATE, so the cost
+    doesn't grow with a Python loop over every pet.
     """
-    active_pets = ActiveTamagotchi.objects.all()
-    count = 0
+    if lazy_decay_enabled():
+        # Mood is derived on read and settled on interaction (see mood.py)
+        return "Lazy decay enabled, nothing to update"
+
     now = timezone.now()
-    # Ensure current_hour is in 0-23 format based on local time or server time? 
-    # Usually servers are UTC. Users might be anywhere.
-    # For MVP Phase 1: We assume server time or naive handling for now, 
-    # but ideally we should handle user timezone. 
-    # User request "If the current time is between..." implies a global check or user-specific check.
-    # The constraint says "Sleep Window logic ... configurable by the user".
-    # So we should check the user's specific sleep window against the user's local time?
-    # Or just use server time for simplicity as Phase 1?
-    # Given "Sleep Window logic: If the current time is between X and Y...", 
-    # I'll implement logic that checks the hour of `now` (UTC) against the user's window constants.
-    # NOTE: This assumes user sets window in UTC or we just use server time.
-    # For Phase 1, we'll just use the hour from `now`.
-
-    current_hour = timezone.localtime().hour
-
-    for pet in active_pets:
-        # Check sleep window
-        # Handle wrapping (e.g. 23 to 7)
-        is_sleeping = False
-        if pet.sleep_start_hour > pet.sleep_end_hour:
-             # Example: 23 to 7. Sleeping if hour >= 23 OR hour < 7
-             if current_hour >= pet.sleep_start_hour or current_hour < pet.sleep_end_hour:
-                 is_sleeping = True
-        else:
-             # Example: 1 to 5. Sleeping if hour >= 1 AND hour < 5
-             if pet.sleep_start_hour <= current_hour < pet.sleep_end_hour:
-                 is_sleeping = True
-        
-        if is_sleeping:
-            continue
-
-        # Decay
-        # Decay
-        decay_amount = 0.7
-        # If pet is dead, do not decay further (stays at 0)
-        if pet.mood > 0:
-             pet.mood = max(0.0, pet.mood - decay_amount)
-             
-        pet.last_decay_update = now
-        pet.save()
-        count += 1
-    
+    alive = ActiveTamagotchi.objects.filter(mood__gt=0)
+    zones = alive.order_by().values_list("timezone", flat=True).distinct()
+
+    count = alive.filter(awake_now(now, zones)).update(
+        mood=Greatest(F("mood") - MOOD_DECAY_PER_TICK, Value(0.0)),
+        last_decay_update=now,
+    )
+
     return f"Updated {count} tamagotchis"
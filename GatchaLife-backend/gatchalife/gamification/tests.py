@@ -1,11 +1,24 @@
-from django.test import TestCase
+import tempfile
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch
-from .models import Player, Card, UserCard
+from .models import Player, Card, UserCard, ActiveTamagotchi, CompanionImage, CompanionState
 from gatchalife.character.models import Series, Character, CharacterVariant
 from gatchalife.style.models import Rarity, Style, Theme
+from gatchalife.generated_image.models import GeneratedImage
+from .drop_table import DropEntry, get_drop_table
+from .services import draw_drops, grant_drops
+from .schedule import PetSchedule
+from .tasks import update_tamagotchi_stats
+import datetime
+from zoneinfo import ZoneInfo
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class GatchaRollTests(TestCase):
     def setUp(self):
@@ -26,7 +39,7 @@ class GatchaRollTests(TestCase):
         self.style = Style.objects.create(name="Anime", rarity=self.rarity_common)
         self.theme = Theme.objects.create(name="Forest")
 
-    @patch('gatchalife.gamification.views.generate_image')
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
     def test_roll_success(self, mock_generate):
         """Test a successful roll"""
         response = self.client.post('/gamification/gatcha/roll/')
@@ -43,6 +56,22 @@ class GatchaRollTests(TestCase):
         self.assertEqual(UserCard.objects.count(), 1)
         self.assertEqual(Card.objects.count(), 1)
 
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
+    def test_roll_queues_missing_images(self, mock_enqueue):
+        """Missing images are queued after commit and returned as pollable jobs"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/gamification/gatcha/roll/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job_ids = [j['job_id'] for j in response.data['image_jobs']]
+        self.assertEqual(len(job_ids), GeneratedImage.objects.count())
+        mock_enqueue.assert_called_once()
+        self.assertEqual([str(j.id) for j in mock_enqueue.call_args[0][0]], job_ids)
+
+        job_response = self.client.get(f'/jobs/{job_ids[0]}/')
+        self.assertEqual(job_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(job_response.data['status'], 'PENDING')
+
     def test_roll_insufficient_funds(self):
         self.player.gatcha_coins = 50
         self.player.save()
@@ -51,7 +80,7 @@ class GatchaRollTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['error'], 'Not enough coins')
 
-    @patch('gatchalife.gamification.views.generate_image')
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
     @patch('random.randint')
     def test_roll_rarity_selection(self, mock_randint, mock_generate):
         """Test that high roll selects Rare"""
@@ -64,7 +93,7 @@ class GatchaRollTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['roll_info']['rarity'], 'Rare')
 
-    @patch('gatchalife.gamification.views.generate_image')
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
     @patch('random.choice')
     @patch('random.randint')
     def test_duplicate_card_stacking(self, mock_randint, mock_choice, mock_generate):
@@ -81,6 +110,64 @@ class GatchaRollTests(TestCase):
         self.assertEqual(UserCard.objects.first().count, 2)
         self.assertEqual(UserCard.objects.count(), 1) # Still only 1 entry
 
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
+    def test_multi_roll_single_debit(self, mock_generate):
+        """Test that ?count=N performs N pulls with a single debit"""
+        response = self.client.post('/gamification/gatcha/roll/?count=3')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rolls'], 3)
+        self.assertEqual(len(response.data['drops']), 15)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.gatcha_coins, 700)
+
+    def test_multi_roll_count_validation(self):
+        response = self.client.post('/gamification/gatcha/roll/?count=1000')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post('/gamification/gatcha/roll/?count=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.gatcha_coins, 1000)
+
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
+    def test_multi_roll_insufficient_funds(self, mock_generate):
+        response = self.client.post('/gamification/gatcha/roll/?count=10')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/gamification/gatcha/roll/?count=2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Not enough coins')
+
+    @patch('gatchalife.gamification.views.enqueue_image_generation')
+    @patch('random.choice')
+    @patch('random.randint')
+    def test_repeated_drops_stack_in_one_roll(self, mock_randint, mock_choice, mock_generate):
+        """Repeated drops of the same card report a running count"""
+        mock_randint.return_value = 1
+        mock_choice.side_effect = lambda x: x[0]
+
+        response = self.client.post('/gamification/gatcha/roll/')
+        drops = response.data['drops']
+        self.assertEqual([d['count'] for d in drops], [1, 2, 3, 4, 5])
+        self.assertEqual([d['is_new'] for d in drops], [True, False, False, False, False])
+        self.assertEqual(UserCard.objects.get().count, 5)
+
+    @patch('random.randint', return_value=1)
+    def test_grant_drops_query_count_is_constant(self, mock_randint):
+        """Granting 5 or 10 drops costs the same number of queries"""
+        table = get_drop_table()
+        grant_drops(self.player, draw_drops(self.player, table, 1))
+
+        drops = draw_drops(self.player, table, 5)
+        with CaptureQueriesContext(connection) as five:
+            grant_drops(self.player, drops)
+        drops = draw_drops(self.player, table, 10)
+        with CaptureQueriesContext(connection) as ten:
+            grant_drops(self.player, drops)
+        self.assertEqual(len(five), len(ten))
+
 class PlayerCollectionTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -106,3 +193,328 @@ class PlayerCollectionTests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['count'], 5)
         self.assertEqual(response.data[0]['card']['character_name'], "C1")
+
+    def test_collection_etag_follows_collection_changes(self):
+        etag = self.client.get('/gamification/collection/?show_all=true')["ETag"]
+        response = self.client.get('/gamification/collection/?show_all=true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        UserCard.objects.filter(player=self.player).get().save()
+        response = self.client.get('/gamification/collection/?show_all=true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_collection_list_query_count_is_constant(self):
+        GeneratedImage.objects.create(
+            image="generated_images/c1.png",
+            character_variant=self.var, rarity=self.rarity, style=self.style, theme=self.theme,
+        )
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get('/gamification/collection/')
+        self.assertTrue(response.data[0]['card']['image_url'].endswith("generated_images/c1.png"))
+
+        for i in range(3):
+            var = CharacterVariant.objects.create(name=f"V{i + 2}", character=self.char)
+            card = Card.objects.create(
+                character_variant=var, rarity=self.rarity, style=self.style, theme=self.theme
+            )
+            UserCard.objects.create(player=self.player, card=card)
+
+        with CaptureQueriesContext(connection) as four:
+            response = self.client.get('/gamification/collection/')
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(one), len(four))
+
+class CatalogCollectionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='Player1')
+        self.player = Player.objects.create(user=self.user)
+
+        self.rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        self.style = Style.objects.create(name="St1", rarity=self.rarity)
+        self.theme = Theme.objects.create(name="Th1")
+        self.series = Series.objects.create(name="S1")
+        self.char = Character.objects.create(name="C1", series=self.series)
+        configs = [
+            {"rarity": "COMMON", "style": {"name": "St1"}, "theme": {"name": "Th1"}, "pose": "a"},
+            {"rarity": "COMMON", "style": {"name": "St2"}, "theme": {"name": "Th1"}, "pose": "b"},
+        ]
+        self.variants = [
+            CharacterVariant.objects.create(name=f"V{i}", character=self.char, card_configurations_data=configs)
+            for i in range(3)
+        ]
+        card = Card.objects.create(
+            character_variant=self.variants[0], rarity=self.rarity, style=self.style, theme=self.theme
+        )
+        UserCard.objects.create(player=self.player, card=card, count=2)
+
+    def test_show_all_lists_owned_and_virtual_cards(self):
+        response = self.client.get('/gamification/collection/?show_all=true')
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]['count'], 2)
+        self.assertIsNone(response.data[1]['id'])
+        self.assertEqual(response.data[1]['card']['series_name'], "S1")
+
+    def test_show_all_uses_latest_image(self):
+        for name in ("old", "new"):
+            GeneratedImage.objects.create(
+                image=f"generated_images/{name}.png",
+                character_variant=self.variants[0], rarity=self.rarity, style=self.style, theme=self.theme,
+            )
+        response = self.client.get('/gamification/collection/?show_all=true')
+        self.assertTrue(response.data[0]['card']['image_url'].endswith("generated_images/new.png"))
+
+    def test_show_all_page_number_pagination(self):
+        response = self.client.get('/gamification/collection/?show_all=true&page_size=4&page=2')
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_show_all_cursor_pagination(self):
+        seen = []
+        url = '/gamification/collection/?show_all=true&page_size=4&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [(c['card']['character_variant'], c['card']['style_name']) for c in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_show_all_cursor_survives_deleted_variant(self):
+        response = self.client.get('/gamification/collection/?show_all=true&page_size=3&cursor=')
+        self.assertEqual(response.data['results'][-1]['card']['character_variant'], self.variants[1].id)
+
+        # The cursor's variant is gone: the next one must start from its first config
+        self.variants[1].delete()
+        response = self.client.get(response.data['next'])
+        seen = [(c['card']['character_variant'], c['card']['style_name']) for c in response.data['results']]
+        self.assertEqual(seen, [(self.variants[2].id, "St1"), (self.variants[2].id, "St2")])
+
+    def test_show_all_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/gamification/collection/?show_all=true')
+
+        other_series = Series.objects.create(name="S2")
+        other_char = Character.objects.create(name="C2", series=other_series)
+        for i in range(5):
+            CharacterVariant.objects.create(
+                name=f"W{i}", character=other_char,
+                card_configurations_data=self.variants[0].card_configurations_data,
+            )
+
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/gamification/collection/?show_all=true')
+        self.assertEqual(len(response.data), 16)
+        self.assertEqual(response.data[-1]['card']['series_name'], "S2")
+        self.assertEqual(len(few), len(many))
+
+    def test_show_all_invalid_cursor(self):
+        response = self.client.get('/gamification/collection/?show_all=true&cursor=nope')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DropTableTests(TestCase):
+    def setUp(self):
+        self.rarity_common, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        self.series = Series.objects.create(name="S1")
+        self.char = Character.objects.create(name="C1", series=self.series)
+        self.style = Style.objects.create(name="St1", rarity=self.rarity_common)
+        self.theme = Theme.objects.create(name="Th1")
+        self.variant = CharacterVariant.objects.create(
+            name="V1",
+            character=self.char,
+            card_configurations_data=[
+                {"rarity": "COMMON", "pose": "wave", "style": {"name": "St1"}, "theme": {"name": "Th1"}},
+                {"rarity": "COMMON", "pose": "old", "legacy": True},
+            ],
+        )
+
+    def test_entries_are_resolved(self):
+        table = get_drop_table()
+        entries = table.entries[self.rarity_common.id]
+        # Legacy config is excluded
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0], DropEntry(self.variant.id, 0, self.style.id, self.theme.id))
+        self.assertEqual(table.config_for(entries[0])["pose"], "wave")
+
+    def test_table_reused_until_catalog_write(self):
+        table = get_drop_table()
+        self.assertIs(get_drop_table(), table)
+
+        Theme.objects.create(name="Th2")
+        self.assertIsNot(get_drop_table(), table)
+
+    def test_legacy_variant_removed_after_update(self):
+        self.variant.legacy = True
+        self.variant.save()
+        table = get_drop_table()
+        self.assertEqual(table.entries[self.rarity_common.id], [])
+        self.assertNotIn(self.variant.id, table.variants)
+
+
+class TamagotchiDecayTests(TestCase):
+    def make_pet(self, username, start, end, mood=50.0, tz=""):
+        player = Player.objects.create(user=User.objects.create(username=username))
+        return ActiveTamagotchi.objects.create(
+            player=player, mood=mood, sleep_start_hour=start, sleep_end_hour=end, timezone=tz
+        )
+
+    @patch('gatchalife.gamification.tasks.timezone.now')
+    def test_decay_respects_sleep_windows(self, mock_now):
+        # 12:00 in Europe/Paris (TIME_ZONE), 06:00 in New York
+        mock_now.return_value = datetime.datetime(2025, 1, 1, 11, 0, tzinfo=datetime.timezone.utc)
+        awake = self.make_pet("awake", 23, 7)
+        napping = self.make_pet("napping", 10, 14)
+        wrapped = self.make_pet("wrapped", 11, 3)
+        dead = self.make_pet("dead", 23, 7, mood=0.0)
+        almost = self.make_pet("almost", 1, 5, mood=0.5)
+        new_york = self.make_pet("new_york", 23, 7, tz="America/New_York")
+        tokyo = self.make_pet("tokyo", 23, 7, tz="Asia/Tokyo")
+
+        # Dead pets are not selected
+        self.assertEqual(update_tamagotchi_stats(), "Updated 3 tamagotchis")
+
+        moods = {p.pk: p.mood for p in ActiveTamagotchi.objects.all()}
+        self.assertAlmostEqual(moods[awake.pk], 49.3)
+        self.assertEqual(moods[napping.pk], 50.0)
+        self.assertEqual(moods[wrapped.pk], 50.0)
+        self.assertEqual(moods[dead.pk], 0.0)
+        self.assertEqual(moods[almost.pk], 0.0)
+        self.assertEqual(moods[new_york.pk], 50.0)
+        # 20:00 in Tokyo: awake
+        self.assertAlmostEqual(moods[tokyo.pk], 49.3)
+
+    @override_settings(TAMAGOTCHI_LAZY_DECAY=True)
+    def test_lazy_decay_is_derived_on_read_and_settled_on_interaction(self):
+        # Equal start/end hours: never sleeping
+        pet = self.make_pet("Player1", 0, 0)
+        two_hours_ago = timezone.now() - datetime.timedelta(hours=2)
+        ActiveTamagotchi.objects.filter(pk=pet.pk).update(last_decay_update=two_hours_ago)
+
+        self.assertEqual(update_tamagotchi_stats(), "Lazy decay enabled, nothing to update")
+
+        client = APIClient()
+        response = client.get(f'/gamification/tamagotchi/{pet.pk}/')
+        self.assertAlmostEqual(response.data['mood'], 50 - 0.7 * 12, places=1)
+        pet.refresh_from_db()
+        self.assertEqual(pet.mood, 50.0)
+
+        response = client.post(f'/gamification/tamagotchi/{pet.pk}/pet/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pet.refresh_from_db()
+        self.assertAlmostEqual(pet.mood, 50 - 0.7 * 12 + 1.0, places=1)
+        self.assertGreater(pet.last_decay_update, two_hours_ago)
+
+    @override_settings(TAMAGOTCHI_LAZY_DECAY=True)
+    def test_lazy_decay_is_settled_on_update(self):
+        pet = self.make_pet("Player1", 0, 0)
+        a_day_ago = timezone.now() - datetime.timedelta(days=1)
+        ActiveTamagotchi.objects.filter(pk=pet.pk).update(last_decay_update=a_day_ago)
+        client = APIClient()
+
+        # A written mood starts decaying now
+        response = client.patch(f'/gamification/tamagotchi/{pet.pk}/', {'mood': 100.0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data['mood'], 100.0, places=1)
+
+        # Two awake hours accrued before the sleep window changes stay accrued
+        two_hours_ago = timezone.now() - datetime.timedelta(hours=2)
+        ActiveTamagotchi.objects.filter(pk=pet.pk).update(last_decay_update=two_hours_ago)
+        now = timezone.localtime()
+        response = client.patch(
+            f'/gamification/tamagotchi/{pet.pk}/',
+            {'sleep_start_hour': (now.hour - 3) % 24, 'sleep_end_hour': (now.hour + 3) % 24},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pet.refresh_from_db()
+        self.assertAlmostEqual(pet.mood, 100 - 0.7 * 12, places=1)
+        self.assertTrue(response.data['is_sleeping'])
+
+
+class PetScheduleTests(TestCase):
+    def paris(self, hour, minute=0, day=15):
+        return datetime.datetime(2025, 1, day, hour, minute, tzinfo=ZoneInfo("Europe/Paris"))
+
+    def test_meal_windows_and_transitions(self):
+        schedule = PetSchedule("Europe/Paris", 23, 7)
+        self.assertEqual(schedule.meal_window(self.paris(8)), "Breakfast")
+        self.assertEqual(schedule.meal_window(self.paris(13)), "Lunch")
+        self.assertEqual(schedule.meal_window(self.paris(22)), "Dinner")
+        self.assertIsNone(schedule.meal_window(self.paris(3)))
+        self.assertEqual(schedule.meal_window_opened_at(self.paris(22, 30)), self.paris(18))
+        self.assertEqual(schedule.next_transition(self.paris(22, 30)), self.paris(23))
+        self.assertEqual(schedule.next_transition(self.paris(23, 30)), self.paris(7, day=16))
+        self.assertEqual(schedule.awake_seconds_between(self.paris(22), self.paris(8, day=16)), 2 * 3600)
+
+        # Late sleepers have dinner past midnight
+        late = PetSchedule("Europe/Paris", 2, 10)
+        self.assertEqual(late.meal_window(self.paris(1)), "Dinner")
+        self.assertEqual(late.meal_window_opened_at(self.paris(1)), self.paris(18, day=14))
+
+        self.assertIsNone(PetSchedule("Europe/Paris", 0, 0).next_transition(self.paris(12)))
+
+    def test_sleep_and_feed_use_the_pet_timezone(self):
+        player = Player.objects.create(user=User.objects.create(username="Player1"))
+        pet = ActiveTamagotchi.objects.create(player=player, mood=70.0, timezone="Asia/Tokyo")
+        client = APIClient()
+
+        with patch('django.utils.timezone.now') as mock_now:
+            # 12:30 in Tokyo, 04:30 in Paris
+            mock_now.return_value = datetime.datetime(2025, 1, 15, 3, 30, tzinfo=datetime.timezone.utc)
+            response = client.get(f'/gamification/tamagotchi/{pet.pk}/')
+            self.assertFalse(response.data['is_sleeping'])
+
+            response = client.post(f'/gamification/tamagotchi/{pet.pk}/feed/')
+            self.assertEqual(response.data['detail'], "Yummy! (Lunch)")
+            response = client.post(f'/gamification/tamagotchi/{pet.pk}/feed/')
+            self.assertEqual(response.data['detail'], "I already had Lunch!")
+
+        response = client.patch(
+            f'/gamification/tamagotchi/{pet.pk}/', {'timezone': 'Mars/Olympus'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('timezone', response.data)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class CompanionImageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.char = Character.objects.create(name="C1", series=Series.objects.create(name="S1"))
+        player = Player.objects.create(user=User.objects.create(username="Player1"))
+        # Equal start/end hours: never sleeping
+        self.pet = ActiveTamagotchi.objects.create(
+            player=player, character=self.char, mood=90.0, sleep_start_hour=0, sleep_end_hour=0
+        )
+
+    def add_image(self, state):
+        image = CompanionImage(character=self.char, state=state)
+        image.image.save(f"{state}.png", ContentFile(b"png"))
+        return image
+
+    def test_image_map_is_cached_and_invalidated_on_write(self):
+        client = APIClient()
+        url = f'/gamification/tamagotchi/{self.pet.pk}/'
+        self.assertIsNone(client.get(url).data['character_image'])
+
+        happy = self.add_image(CompanionState.EXTREMELY_HAPPY)
+        response = client.get(url)
+        self.assertTrue(response.data['character_image'].endswith(happy.image.url))
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(url)
+        self.assertFalse(any('companionimage' in q['sql'] for q in ctx.captured_queries))
+
+        happy.delete()
+        self.assertIsNone(client.get(url).data['character_image'])
+
+    def test_moved_image_leaves_the_old_character(self):
+        client = APIClient()
+        url = f'/gamification/tamagotchi/{self.pet.pk}/'
+        happy = self.add_image(CompanionState.EXTREMELY_HAPPY)
+        self.assertIsNotNone(client.get(url).data['character_image'])
+
+        happy.character = Character.objects.create(name="C2", series=self.char.series)
+        happy.save()
+        self.assertIsNone(client.get(url).data['character_image'])
@@ -9,14 +9,34 @@ from .serializers import (
     UserCardSerializer,
     ActiveTamagotchiSerializer,
 )
+from gatchalife.character.config_index import get_config_index
 from gatchalife.character.models import CharacterVariant
-from gatchalife.style.models import Rarity, Style, Theme
-import random
 import structlog
 from django.urls import reverse
-from gatchalife.generated_image.services import generate_image, match_card_configuration
-from gatchalife.generated_image.models import GeneratedImage
+from gatchalife.generated_image.services import (
+    create_generation_jobs,
+    generate_image,
+    latest_image_map,
+    match_card_configuration,
+)
+from gatchalife.generated_image.tasks import enqueue_image_generation
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from rest_framework.utils.urls import replace_query_param
+from gatchalife.versioning import CATALOG, COLLECTION, VersionedConditionalMixin
+from .catalog import CatalogSnapshot
+from .drop_table import get_drop_table
+from .mood import settle_mood
+from .schedule import get_schedule
+from .pagination import (
+    CATALOG_PAGE_SIZE,
+    CollectionPagination,
+    decode_catalog_cursor,
+    encode_catalog_cursor,
+)
+from .services import PULLS_PER_ROLL, ROLL_COST, draw_drops, find_missing_images, grant_drops
 
 logger = structlog.get_logger(__name__)
 
@@ -58,17 +78,49 @@ class PlayerQuestViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'status': 'claimed'})
         return Response({'error': 'Cannot claim reward'}, status=status.HTTP_400_BAD_REQUEST)
 
-class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
+class CollectionViewSet(VersionedConditionalMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = UserCardSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CollectionPagination
+    # Owned cards and catalog cards both depend on the catalog and the collection
+    version_scopes = (CATALOG, COLLECTION)
 
     def get_queryset(self):
         player = get_default_player()
-        queryset = UserCard.objects.filter(player=player)
-        return queryset
-            
+        queryset = UserCard.objects.filter(player=player).select_related(
+            "card__character_variant__character__series",
+            "card__rarity",
+            "card__style",
+            "card__theme",
+        )
         return queryset
 
+    def _list_owned(self, request):
+        """
+        Default (owned cards) listing. Related objects come from select_related and
+        the latest images of the whole page from one latest_image_map query, so the
+        number of queries doesn't depend on the page size.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        user_cards = page if page is not None else list(queryset)
+
+        context = self.get_serializer_context()
+        context["image_map"] = latest_image_map(
+            (
+                uc.card.character_variant_id,
+                uc.card.rarity_id,
+                uc.card.style_id,
+                uc.card.theme_id,
+            )
+            for uc in user_cards
+        )
+        serializer = self.get_serializer(user_cards, many=True, context=context)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["post"])
     def reroll_image(self, request, pk=None):
         user_card = self.get_object()
@@ -121,6 +173,9 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
     def list(self, request, *args, **kwargs):
+        return self._conditional(request, self._list_collection, *args, **kwargs)
+
+    def _list_collection(self, request, *args, **kwargs):
         show_all = request.query_params.get("show_all") == "true"
         show_archived = request.query_params.get("show_archived") == "true"
 
@@ -131,14 +186,18 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
             # Standard filter_qs does NOT hide legacy cards by default (unless I changed it).
             # Let's check filter_queryset. It just applies Rarity/Theme/etc.
             # So default behavior shows owned legacy cards.
-            # But if show_all is False, we just return super().list().
-            return super().list(request, *args, **kwargs)
+            # But if show_all is False, we just list the owned cards.
+            return self._list_owned(request)
 
         # --- Show All Logic ---
         player = get_default_player()
 
-        # 1. Fetch base variants (applying character/series filters)
-        variants_qs = CharacterVariant.objects.select_related("character")
+        # 1. Fetch base variants (applying character/series filters), in keyset order
+        variants_qs = (
+            CharacterVariant.objects.select_related("character")
+            .annotate(series_key=Coalesce("character__series_id", Value(0)))
+            .order_by("series_key", "character_id", "id")
+        )
 
         if not show_archived:
             variants_qs = variants_qs.filter(legacy=False, character__legacy=False)
@@ -173,145 +232,160 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
             )
             owned_map[key] = uc
 
-        # 3. Build comprehensive list
-        combined_list = []
-
-        # Optimization: Prefetch all images for these variants to avoid N+1 in Serializer
-        # We fetch all images for the variants we are about to process
-        # This is much faster than querying per card
-        all_images = (
-            GeneratedImage.objects.filter(character_variant__in=variants_qs)
-            .values(
-                "character_variant_id",
-                "rarity_id",
-                "style_id",
-                "theme_id",
-                "image",
-                "thumbnail",  # <--- Add this
-                "created_at",
-            )
-            .order_by("created_at")
-        )
+        base_context = self.get_serializer_context()
+        base_context["catalog"] = CatalogSnapshot()
 
-        # Build map: (v_id, r_id, s_id, t_id) -> {image: url, thumbnail: url}
-        image_map = {}
-        for img in all_images:
-            # We construct a dict containing both URLs
-            key = (
-                img["character_variant_id"],
-                img["rarity_id"],
-                img["style_id"],
-                img["theme_id"],
+        # 3. Keyset mode: ?cursor=... (or cursor= on the first page) walks the catalog
+        # lazily and stops as soon as the page is full, so latency doesn't grow with it.
+        if "cursor" in request.query_params:
+            return self._list_catalog_page(
+                request, variants_qs, owned_map, show_archived, base_context
             )
 
-            image_url = settings.MEDIA_URL + img["image"] if img["image"] else None
+        # 4. Page-number mode: slots are cheap tuples, only the requested page is serialized
+        slots = list(self._catalog_slots(request, variants_qs, owned_map, show_archived))
+        page = self.paginate_queryset(slots)
+        if page is not None:
+            return self.get_paginated_response(self._serialize_slots(page, base_context))
+
+        return Response(self._serialize_slots(slots, base_context))
+
+    def _catalog_slots(
+        self, request, variants, owned_map, show_archived, cursor_variant_id=None, after_index=None
+    ):
+        """
+        Yields (variant, config entry, owned UserCard or None) for every card of the
+        catalog view, in (series, character, variant, config index) order, without
+        serializing anything. `after_index` skips the configs of the cursor's variant
+        up to and including that index (keyset resume point); it doesn't apply if
+        that variant is gone.
+        """
+        rarity_param = request.query_params.get("rarity")
+        style_param = request.query_params.get("style")
+        theme_param = request.query_params.get("theme")
+
+        for variant in variants:
+            resumed = variant.id == cursor_variant_id
+            for entry in get_config_index(variant).entries:
+                if resumed and entry.index <= after_index:
+                    continue
+                if entry.legacy and not show_archived:
+                    continue
 
-            # Use thumbnail if available, otherwise fallback to full image
-            thumbnail_url = None
-            if img["thumbnail"]:
-                thumbnail_url = settings.MEDIA_URL + img["thumbnail"]
-            elif image_url:
-                thumbnail_url = image_url
+                # Apply filters (Rarity, Style, Theme)
+                if rarity_param and rarity_param.upper() != entry.rarity:
+                    continue
+                if style_param and style_param != entry.style:
+                    continue
+                if theme_param and theme_param != entry.theme:
+                    continue
 
-            image_map[key] = {"image_url": image_url, "thumbnail_url": thumbnail_url}
+                user_card = owned_map.get((variant.id, entry.rarity, entry.style, entry.theme))
 
-        base_context = self.get_serializer_context()
-        base_context["image_map"] = image_map  # Pass the new dict structure
+                # REQUEST 404: Don't show uncollected cards if they are legacy
+                if user_card is None and self._is_archived(variant, entry):
+                    continue
 
-        # Pre-fetch Rarity/Style/Theme objects for name lookup to ensure consistency if needed
-        # But for constructing the "virtual" card, strings might be enough if Serializer handles it
-        # Actually, we need to manually construct the dict to match Serializer output
+                yield variant, entry, user_card
 
-        for variant in variants_qs:
-            configs = variant.card_configurations_data or []
-            for config in configs:
-                if config.get("legacy") and not show_archived:
-                    continue
+    def _is_archived(self, variant, entry):
+        return variant.legacy or variant.character.legacy or entry.legacy
 
-                r_name = config.get("rarity", "").upper()
-                s_name = config.get("style", {}).get("name")
-                t_name = config.get("theme", {}).get("name")
+    def _serialize_slots(self, slots, context):
+        # Latest images of the owned cards on this page only (virtual cards have none)
+        context["image_map"] = latest_image_map(
+            (
+                uc.card.character_variant_id,
+                uc.card.rarity_id,
+                uc.card.style_id,
+                uc.card.theme_id,
+            )
+            for _, _, uc in slots
+            if uc is not None
+        )
+        return [self._serialize_slot(slot, context) for slot in slots]
+
+    def _serialize_slot(self, slot, context):
+        variant, entry, user_card = slot
+        if user_card is not None:
+            # User owns it - serialize normally
+            # Use manual instantiation to pass optimized context
+            return UserCardSerializer(user_card, context=context).data
+
+        # User doesn't own it - create placeholder
+        # Virtual cards don't carry Rarity/Style/Theme ids, so image_map isn't used
+        # and "image_url": None makes the client render its placeholder.
+        return {
+            "id": None,  # Virtual
+            "count": 0,
+            "obtained_at": None,
+            "card": {
+                "id": None,
+                "character_variant": variant.id,
+                "character_variant_name": variant.name,
+                "character_name": variant.character.name,
+                "series_name": context["catalog"].series_name(variant.character),
+                "rarity_name": entry.rarity,
+                "style_name": entry.style,
+                "theme_name": entry.theme,
+                "image_url": None,  # Placeholder trigger
+                "visual_override": variant.visual_override,
+                "description": variant.description,
+                "is_archived": self._is_archived(variant, entry),
+            },
+        }
 
-                # Apply filters (Rarity, Style, Theme)
-                if (
-                    request.query_params.get("rarity")
-                    and request.query_params.get("rarity").upper() != r_name
-                ):
-                    continue
-                if (
-                    request.query_params.get("style")
-                    and request.query_params.get("style") != s_name
-                ):
-                    continue
-                if (
-                    request.query_params.get("theme")
-                    and request.query_params.get("theme") != t_name
-                ):
-                    continue
+    def _list_catalog_page(self, request, variants_qs, owned_map, show_archived, context):
+        try:
+            page_size = int(request.query_params.get("page_size", CATALOG_PAGE_SIZE))
+        except ValueError:
+            page_size = CATALOG_PAGE_SIZE
+        page_size = max(1, min(page_size, CollectionPagination.max_page_size))
+
+        variant_id = after_index = None
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            try:
+                series_key, character_id, variant_id, after_index = decode_catalog_cursor(cursor)
+            except ValueError:
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+            variants_qs = variants_qs.filter(
+                Q(series_key__gt=series_key)
+                | Q(series_key=series_key, character_id__gt=character_id)
+                | Q(series_key=series_key, character_id=character_id, id__gte=variant_id)
+            )
 
-                key = (variant.id, r_name, s_name, t_name)
-                is_archived = (
-                    variant.legacy
-                    or variant.character.legacy
-                    or config.get("legacy", False)
-                )
+        slots = []
+        for slot in self._catalog_slots(
+            request,
+            variants_qs.iterator(chunk_size=100),
+            owned_map,
+            show_archived,
+            variant_id,
+            after_index,
+        ):
+            slots.append(slot)
+            if len(slots) > page_size:
+                break
 
-                if key in owned_map:
-                    # User owns it - serialize normally
-                    # Use manual instantiation to pass optimized context
-                    serializer = UserCardSerializer(
-                        owned_map[key], context=base_context
-                    )
-                    combined_list.append(serializer.data)
-                else:
-                    # User doesn't own it - create placeholder
-                    # REQUEST 404: Don't show uncollected cards if they are legacy
-                    if is_archived:
-                        continue
-
-                    # Try to find image url from map for placeholder
-                    # We need the IDs for the key.
-                    # This is tricky because we only have names here.
-                    # Ideally we should map names to IDs or change image_map key to names.
-                    # But CardSerializer uses IDs.
-                    # For virtual cards, we don't use CardSerializer (we assume None).
-                    # Actually, we might want to show the image if it exists even if unowned?
-                    # The current code sets "image_url": None.
-                    # If we want to show image for unowned, we need to map names to IDs or use IDs if we have them.
-                    # We have variant.id. But we don't have rarity_id easily without refreshing cache.
-                    # However, the previous code essentially set image_url to None for virtual cards.
-                    # So we ignore image_map for virtual cards for now.
-
-                    combined_list.append(
-                        {
-                            "id": None,  # Virtual
-                            "count": 0,
-                            "obtained_at": None,
-                            "card": {
-                                "id": None,
-                                "character_variant": variant.id,
-                                "character_variant_name": variant.name,
-                                "character_name": variant.character.name,
-                                "series_name": variant.character.series.name
-                                if variant.character.series
-                                else "Unknown",
-                                "rarity_name": r_name,
-                                "style_name": s_name,
-                                "theme_name": t_name,
-                                "image_url": None,  # Placeholder trigger
-                                "visual_override": variant.visual_override,
-                                "description": variant.description,
-                                "is_archived": is_archived,
-                            },
-                        }
-                    )
-
-        # 4. Pagination (Manual)
-        page = self.paginate_queryset(combined_list)
-        if page is not None:
-            return self.get_paginated_response(page)
+        next_url = None
+        if len(slots) > page_size:
+            slots = slots[:page_size]
+            variant, entry, _ = slots[-1]
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                "cursor",
+                encode_catalog_cursor(
+                    variant.series_key, variant.character_id, variant.id, entry.index
+                ),
+            )
 
-        return Response(combined_list)
+        return Response(
+            {
+                "next": next_url,
+                "results": self._serialize_slots(slots, context),
+            }
+        )
 
     @action(detail=False, methods=["get"])
     def preview(self, request):
@@ -324,24 +398,17 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({"error": "Missing params"}, status=400)
 
         try:
-            variant = CharacterVariant.objects.get(id=variant_id)
+            variant = CharacterVariant.objects.select_related("character").get(id=variant_id)
         except CharacterVariant.DoesNotExist:
             return Response({"error": "Variant not found"}, status=404)
 
-        configs = variant.card_configurations_data or []
-        target_config = None
-        for c in configs:
-            if (
-                c.get("rarity", "").upper() == rarity_name.upper()
-                and c.get("style", {}).get("name") == style_name
-                and c.get("theme", {}).get("name") == theme_name
-            ):
-                target_config = c
-                break
+        target_entry = get_config_index(variant).find(rarity_name, style_name, theme_name)
 
-        if not target_config:
+        if not target_entry:
             return Response({"error": "Configuration not found"}, status=404)
 
+        catalog = CatalogSnapshot()
+
         # Mock response
         data = {
             "id": None,
@@ -352,23 +419,21 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
                 "character_variant": variant.id,
                 "character_variant_name": variant.name,
                 "character_name": variant.character.name,
-                "series_name": variant.character.series.name
-                if variant.character.series
-                else "Unknown",
+                "series_name": catalog.series_name(variant.character),
                 "rarity_name": rarity_name,
                 "style_name": style_name,
                 "theme_name": theme_name,
                 "image_url": None,
                 "visual_override": variant.visual_override,
                 "description": variant.description,
-                "pose": target_config.get("pose"),
+                "pose": target_entry.config.get("pose"),
                 "is_archived": False,
             },
         }
 
-        rarity_obj = Rarity.objects.filter(name__iexact=rarity_name).first()
-        style_obj = Style.objects.filter(name=style_name).first()
-        theme_obj = Theme.objects.filter(name=theme_name).first()
+        rarity_obj = catalog.rarity_named(rarity_name)
+        style_obj = catalog.style_named(style_name)
+        theme_obj = catalog.theme_named(theme_name)
 
         # Careful: Style/Theme might be None if user passed 'None' string or empty, but logic above handles names.
         # If objects found, try to correct data with real card info if exists
@@ -382,7 +447,13 @@ class CollectionViewSet(viewsets.ReadOnlyModelViewSet):
             if theme_obj:
                 filters["theme"] = theme_obj
 
-            real_card = Card.objects.filter(**filters).first()
+            real_card = (
+                Card.objects.filter(**filters)
+                .select_related(
+                    "character_variant__character__series", "rarity", "style", "theme"
+                )
+                .first()
+            )
 
             if real_card:
                 from .serializers import (
@@ -425,210 +496,92 @@ class GatchaViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=["post"])
     def roll(self, request):
-        player = get_default_player()
-        cost = 100
-
-        if player.gatcha_coins < cost:
+        """
+        Performs one or more 5-card pulls. `?count=N` runs N pulls in a single
+        transaction with one coin debit, capped by GATCHA_MAX_ROLLS_PER_REQUEST.
+        """
+        max_rolls = getattr(settings, "GATCHA_MAX_ROLLS_PER_REQUEST", 10)
+        try:
+            roll_count = int(request.query_params.get("count", 1))
+        except (TypeError, ValueError):
+            roll_count = 0
+        if not 1 <= roll_count <= max_rolls:
             return Response(
-                {"error": "Not enough coins"}, status=status.HTTP_400_BAD_REQUEST
+                {"error": f"count must be between 1 and {max_rolls}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        player.gatcha_coins -= cost
-        player.save()
+        cost = ROLL_COST * roll_count
 
-        drops_data = [] # List of dicts with selected r, variant, style, theme
-        rarities = Rarity.objects.all()
-        if not rarities.exists():
+        drop_table = get_drop_table()
+        if not drop_table.rarities:
             return Response(
                 {"error": "No rarities defined"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        ordered_rarities = list(rarities.order_by("-min_roll_threshold"))
-        fallback_rarity = rarities.order_by("min_roll_threshold").first()
+        with transaction.atomic():
+            player = Player.objects.select_for_update().get(pk=get_default_player().pk)
 
-        # --- STEP 1: Determine Drop Outcomes ---
-        # Pre-fetch all variants with their configs to avoid N+1 equivalent in loop
-        # Exclude legacy characters and legacy variants
-        all_variants = list(
-            CharacterVariant.objects.filter(
-                character__legacy=False, legacy=False
-            ).select_related("character")
-        )
-        
-        # Map rarity names for easier lookup
-        # Assuming Rarity.name matches the keys in JSON (e.g. "COMMON", "RARE") case-insensitivity might be needed
-
-        attempts = 0
-        max_attempts = 20  # Safety break
-
-        while len(drops_data) < 5 and attempts < max_attempts:
-            attempts += 1
-            # ... (Roll Logic kept same) ...
-            base_roll = random.randint(1, 100)
-            level_bonus = min(player.level * 0.5, 20.0)
-            final_roll = min(base_roll + level_bonus, 100)
-
-            selected_rarity = None
-            for r in ordered_rarities:
-                if final_roll >= r.min_roll_threshold:
-                    selected_rarity = r
-                    break
-            if not selected_rarity:
-                selected_rarity = fallback_rarity
-
-            # Flatten probability: Collect all valid (variant, config) pairs for this rarity
-            valid_cards = []
-            for v in all_variants:
-                configs = v.card_configurations_data
-                for c in configs:
-                    if c.get(
-                        "rarity", ""
-                    ).upper() == selected_rarity.name.upper() and not c.get("legacy"):
-                        valid_cards.append({"variant": v, "config": c})
-
-            if not valid_cards:
-                # Fallback: Pick any variant from valid ones for this rarity
-                selection = {
-                    "variant": random.choice(all_variants) if all_variants else None,
-                    "config": {},
-                }
-                if selection["variant"]:
-                    configs = selection["variant"].card_configurations_data or []
-                    valid_configs = [c for c in configs if not c.get("legacy")]
-                    selection["config"] = (
-                        random.choice(valid_configs) if valid_configs else {}
-                    )
-            else:
-                selection = random.choice(valid_cards)
-
-            if not selection.get("variant"):
-                continue
-
-            variant = selection["variant"]
-            target_config = selection["config"]
-
-            # Resolve Style and Theme from Config
-            style_name = target_config.get('style', {}).get('name')
-            theme_name = target_config.get('theme', {}).get('name')
-            pose_prompt = target_config.get('pose', '')
-            
-            style = None
-            theme = None
-            
-            if style_name:
-                style = Style.objects.filter(
-                    name=style_name, rarity=selected_rarity
-                ).first()
-                if not style:
-                     style = Style.objects.filter(name=style_name).first()
-
-            if theme_name:
-                theme = Theme.objects.filter(name=theme_name).first()
-
-            # Double Fallback if not found
-            if not style:
-                style = Style.objects.filter(rarity=selected_rarity).first() or Style.objects.first()
-            if not theme:
-                theme = Theme.objects.first()
-
-            # Check if this specific card combination is archived (legacy)
-            existing_card = Card.objects.filter(
-                character_variant=variant,
-                rarity=selected_rarity,
-                style=style,
-                theme=theme,
-            ).first()
-
-            if existing_card and existing_card.legacy:
-                logger.info("Skipping legacy card drop", card=existing_card)
-                continue
-
-            drops_data.append({
-                "variant": variant,
-                "rarity": selected_rarity,
-                "style": style,
-                "theme": theme,
-                "pose": pose_prompt,
-                "card_configuration": target_config, # Pass full config
-                "roll_info": {
-                    "base_roll": base_roll,
-                    "level_bonus": level_bonus,
-                    "final_roll": final_roll,
-                    "rarity": selected_rarity.name,
-                }
-            })
-
-        # --- STEP 2: Identify Missing Images (Deduplicated) ---
-        # Deduplicate tasks by (Variant, Rarity, Style, Theme) key.
-        # We process the first encountered configuration for any given key.
-        tasks_map = {} 
-        for d in drops_data:
-             key = (d["variant"], d["rarity"], d["style"], d["theme"])
-             if key not in tasks_map:
-                 tasks_map[key] = d["card_configuration"]
-        
-        missing_combinations = []
-        # Check DB
-        for (variant, r, s, t), config in tasks_map.items():
-            if not GeneratedImage.objects.filter(character_variant=variant, rarity=r, style=s, theme=t).exists():
-                missing_combinations.append((variant, r, s, t, config)) # Pass config instead of just pose
-
-        # --- STEP 3: Parallel Generation ---
-        if missing_combinations:
-            from concurrent.futures import ThreadPoolExecutor, as_completed
+            if player.gatcha_coins < cost:
+                return Response(
+                    {"error": "Not enough coins"}, status=status.HTTP_400_BAD_REQUEST
+                )
 
-            callback_url = request.build_absolute_uri(reverse("n8n-callback"))
+            player.gatcha_coins -= cost
+            player.save(update_fields=["gatcha_coins"])
+
+            # --- STEP 1: Determine Drop Outcomes ---
+            # The compiled drop table already excludes legacy characters/variants/configs
+            # and has Style/Theme resolved for every (variant, config), so a pull is O(1).
+            drops_data = draw_drops(player, drop_table, PULLS_PER_ROLL * roll_count)
+
+            # --- STEP 2: Create Cards and UserCards (bulk) ---
+            granted = grant_drops(player, drops_data)
+
+            # --- STEP 3: Identify Missing Images (Deduplicated across all pulls) ---
+            missing_combinations = find_missing_images(drops_data)
+
+            # --- STEP 4: Queue Generation ---
+            # Only the placeholder GeneratedImage/AsyncJob rows are written here.
+            # Encoding reference images and calling N8N happens in a Celery worker
+            # once the transaction commits; clients poll the returned job ids.
+            image_jobs = create_generation_jobs(missing_combinations)
+            if image_jobs:
+                callback_url = request.build_absolute_uri(reverse("n8n-callback"))
+                transaction.on_commit(
+                    lambda: enqueue_image_generation(image_jobs, callback_url)
+                )
 
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {
-                    executor.submit(
-                        generate_image,
-                        variant,
-                        r,
-                        s,
-                        t,
-                        pose=config.get("pose"),
-                        card_configuration=config,
-                        callback_url=callback_url,
-                    ): (variant, r, s, t)
-                    for (variant, r, s, t, config) in missing_combinations
-                }
-                
-                for future in as_completed(futures):
-                    combo = futures[future]
-                    try:
-                        future.result() # Wait for completion, raise exception if any
-                    except Exception as e:
-                        logger.error("image_generation_failed", combo=combo, error=str(e))
-                        # We continue even if one fails, to give the user their cards (even if image is missing)
-
-        # --- STEP 4: Create Cards and UserCards ---
+        serializer_context = {
+            "request": request,
+            "image_map": latest_image_map(d["key"] for d in drops_data),
+        }
+        serialized_cards = {}
         final_drops = []
-        for d in drops_data:
-            card, _ = Card.objects.get_or_create(
-                character_variant=d["variant"],
-                rarity=d["rarity"],
-                style=d["style"],
-                theme=d["theme"],
-            )
-
-            user_card, created_user_card = UserCard.objects.get_or_create(
-                player=player, card=card
-            )
-            if not created_user_card:
-                user_card.count += 1
-                user_card.save()
-
-            serializer = UserCardSerializer(user_card, context={"request": request})
-            drop_item = serializer.data
-            drop_item["is_new"] = created_user_card
+        for d, (user_card, is_new, count) in zip(drops_data, granted):
+            if user_card.pk not in serialized_cards:
+                serialized_cards[user_card.pk] = UserCardSerializer(
+                    user_card, context=serializer_context
+                ).data
+            drop_item = dict(serialized_cards[user_card.pk])
+            drop_item["count"] = count
+            drop_item["is_new"] = is_new
             drop_item["roll_info"] = d["roll_info"]
             final_drops.append(drop_item)
 
         return Response(
             {
                 "drops": final_drops,
+                "rolls": roll_count,
+                "image_jobs": [
+                    {
+                        "job_id": str(job.id),
+                        "generated_image": int(job.object_id),
+                        "status": job.status,
+                    }
+                    for job in image_jobs
+                ],
                 "remaining_coins": player.gatcha_coins,
             }
         )
@@ -639,7 +592,7 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         player = get_default_player()
-        return ActiveTamagotchi.objects.filter(player=player)
+        return ActiveTamagotchi.objects.filter(player=player).select_related("character")
 
     def perform_create(self, serializer):
         player = get_default_player()
@@ -656,9 +609,15 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
 
         serializer.save(player=player, character=character, name=character.name)
 
+    def perform_update(self, serializer):
+        # Fold the decay accrued under the old mood/schedule in first; a written
+        # mood then starts decaying from now
+        settle_mood(serializer.instance)
+        serializer.save()
+
     @action(detail=True, methods=["post"])
     def feed(self, request, pk=None):
-        pet = self.get_object()
+        pet = settle_mood(self.get_object())
         # self._check_daily_reset(pet) # Quotas removed, daily reset not needed for feeding logic anymore
 
         # Check behavioral matrix
@@ -677,37 +636,15 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
                 {"detail": "Zzz... (Sleeping)"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check Time Windows
-        # Window 1: Sleep End -> 12 (Breakfast)
-        # Window 2: 12 -> 18 (Lunch)
-        # Window 3: 18 -> Sleep Start (Dinner)
-
+        # Meal windows (Breakfast/Lunch/Dinner) are read in the pet's timezone
         from django.utils import timezone
 
         now = timezone.now()
-        current_hour = now.hour
-
-        # Determine strict window boundaries regardless of day wrap for simplicity first
-        # Assuming sleep_end < 12 < 18 < sleep_start for standard day
-        # If sleep schedule is weird, this logic needs to be robust.
-        # Let's assume standard day first: 7am wake, 11pm sleep.
-
-        window_name = None
-
-        if pet.sleep_end_hour <= current_hour < 12:
-            window_name = "Breakfast"
-        elif 12 <= current_hour < 18:
-            window_name = "Lunch"
-        elif 18 <= current_hour < pet.sleep_start_hour:
-            window_name = "Dinner"
-        else:
-            # Likely sleeping or outside feeding hours (should be caught by is_sleeping but just in case)
-            # If sleep start is early (e.g. 20), 18-20 is dinner.
-            # If sleep start is late (e.g. 1am), 18-23 is dinner, 23-1 is sleep.
-            pass
+        schedule = get_schedule(pet)
+        window_name = schedule.meal_window(now)
 
         if not window_name:
-            if self._is_sleeping(pet):
+            if schedule.is_sleeping(now):
                 return Response(
                     {"detail": "I'm sleeping..."}, status=status.HTTP_400_BAD_REQUEST
                 )
@@ -715,32 +652,12 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
                 {"detail": "Not hungry right now."}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if already fed in this window TODAY
-        if pet.last_feed_time:
-            last_feed_local = timezone.localtime(pet.last_feed_time)
-            now_local = timezone.localtime(now)
-
-            # If fed today
-            if last_feed_local.date() == now_local.date():
-                last_hour = last_feed_local.hour
-
-                already_fed = False
-                if window_name == "Breakfast":
-                    if pet.sleep_end_hour <= last_hour < 12:
-                        already_fed = True
-                elif window_name == "Lunch":
-                    if 12 <= last_hour < 18:
-                        already_fed = True
-                elif window_name == "Dinner":
-                    # Handle if sleep start is next day? No, simplified.
-                    if 18 <= last_hour < pet.sleep_start_hour:
-                        already_fed = True
-
-                if already_fed:
-                    return Response(
-                        {"detail": f"I already had {window_name}!"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+        # Check if already fed since this window opened
+        if pet.last_feed_time and pet.last_feed_time >= schedule.meal_window_opened_at(now):
+            return Response(
+                {"detail": f"I already had {window_name}!"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         # Efficiency calculation
         efficiency_multiplier = 1.0
@@ -764,7 +681,7 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"])
     def pet(self, request, pk=None):
-        pet = self.get_object()
+        pet = settle_mood(self.get_object())
         # self._check_daily_reset(pet)
 
         if pet.mood <= 40 and pet.mood > 0:
@@ -815,7 +732,7 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"])
     def resurrect(self, request, pk=None):
-        pet = self.get_object()
+        pet = settle_mood(self.get_object())
         if pet.mood > 0:
             return Response(
                 {"detail": "I'm not dead yet!"}, status=status.HTTP_400_BAD_REQUEST
@@ -843,20 +760,7 @@ class ActiveTamagotchiViewSet(viewsets.ModelViewSet):
     # Removing _check_daily_reset usage from above.
 
     def _is_sleeping(self, pet):
-        from django.utils import timezone
-
-        now = timezone.now()
-        current_hour = now.hour
-        if pet.sleep_start_hour > pet.sleep_end_hour:
-            if (
-                current_hour >= pet.sleep_start_hour
-                or current_hour < pet.sleep_end_hour
-            ):
-                return True
-        else:
-            if pet.sleep_start_hour <= current_hour < pet.sleep_end_hour:
-                return True
-        return False
+        return get_schedule(pet).is_sleeping()
 
 
 from .models import CompanionImage
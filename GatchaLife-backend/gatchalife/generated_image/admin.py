@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from .models import GeneratedImage
+from .models import GeneratedImage, ImageRendition
 
 admin.site.register(GeneratedImage)
+admin.site.register(ImageRendition)
@@ -0,0 +1,171 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from gatchalife.generated_image.models import GeneratedImage, ImageRendition
+from gatchalife.generated_image.renditions import (
+    build_renditions,
+    rendition_formats,
+    replace_renditions,
+)
+from gatchalife.versioning import COLLECTION, bump_version
+
+Status = GeneratedImage.ThumbnailStatus
+
+
+def render_image(row):
+    """
+    Worker: renders the missing thumbnail and the renditions of one image.
+    Only touches storage; the parent process writes the results to the database.
+    Returns (image_id, thumbnail name, placeholder, unsaved renditions, error);
+    the thumbnail name is None if the thumbnail itself couldn't be rendered.
+    """
+    image_id, image_name, thumbnail_name = row
+    image = GeneratedImage(pk=image_id, image=image_name, thumbnail=thumbnail_name)
+    try:
+        if not image.thumbnail:
+            image.generate_thumbnail()
+    except Exception as e:
+        return image_id, None, "", [], str(e)
+    try:
+        renditions = build_renditions(image)
+    except Exception as e:
+        return image_id, image.thumbnail.name, "", [], str(e)
+    return image_id, image.thumbnail.name, image.placeholder, renditions, None
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders missing thumbnails and srcset renditions of stored GeneratedImages "
+        "across a process pool. Safe to interrupt: finished batches are committed "
+        "and a rerun only picks up images still missing their renditions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=multiprocessing.cpu_count(),
+            help="Worker processes (0 renders in this process).",
+        )
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--after-id", type=int, default=0,
+            help="Resume after this GeneratedImage id (printed after every batch).",
+        )
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Also retry images whose thumbnail previously FAILED.",
+        )
+
+    def get_queryset(self, options):
+        statuses = [Status.PENDING, Status.FAILED] if options["retry_failed"] else [Status.PENDING]
+        has_renditions = Exists(ImageRendition.objects.filter(image_id=OuterRef("pk")))
+        return (
+            GeneratedImage.objects.alias(has_renditions=has_renditions)
+            .exclude(image="")
+            .filter(id__gt=options["after_id"])
+            .filter(
+                Q(thumbnail_status__in=statuses)
+                # Thumbnailed before renditions (or placeholders) existed
+                | Q(thumbnail_status=Status.READY, has_renditions=False)
+                | Q(thumbnail_status=Status.READY, placeholder="")
+            )
+            .order_by("id")
+            .values_list("id", "image", "thumbnail")
+        )
+
+    def handle(self, *args, **options):
+        # No rendition would ever be stored, so every READY image would be picked up again
+        if not rendition_formats():
+            raise CommandError(
+                "None of IMAGE_RENDITION_FORMATS can be encoded by this Pillow build."
+            )
+
+        workers, batch_size = options["workers"], options["batch_size"]
+        rows = self.get_queryset(options).iterator(chunk_size=batch_size)
+
+        executor = None
+        if workers > 0:
+            # Spawned (not forked) workers don't inherit the parent's database connection
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        render = executor.map if executor else map
+
+        done = failed = 0
+        start = time.monotonic()
+        try:
+            for batch in batches(rows, batch_size):
+                rendered, errors = self.write_batch(list(render(render_image, batch)))
+                done, failed = done + rendered, failed + errors
+                self.report(done, failed, start, last_id=batch[-1][0])
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {done} images ({failed} failed) in {elapsed:.1f}s, "
+                f"{done / elapsed if elapsed else 0:.1f} images/s"
+            )
+        )
+
+    def write_batch(self, results):
+        ready, thumbnailed, failed, renditions = [], [], [], []
+        for image_id, thumbnail_name, placeholder, image_renditions, error in results:
+            if thumbnail_name is None:
+                self.stderr.write(f"GeneratedImage {image_id}: {error}")
+                failed.append(GeneratedImage(pk=image_id, thumbnail_status=Status.FAILED))
+                continue
+            if error:
+                # The thumbnail is usable, only the renditions are missing (retried on rerun)
+                self.stderr.write(f"GeneratedImage {image_id} renditions: {error}")
+                thumbnailed.append(
+                    GeneratedImage(pk=image_id, thumbnail=thumbnail_name, thumbnail_status=Status.READY)
+                )
+                continue
+            ready.append(
+                GeneratedImage(
+                    pk=image_id,
+                    thumbnail=thumbnail_name,
+                    thumbnail_status=Status.READY,
+                    placeholder=placeholder,
+                )
+            )
+            renditions.extend(image_renditions)
+
+        with transaction.atomic():
+            GeneratedImage.objects.bulk_update(
+                ready, ["thumbnail", "thumbnail_status", "placeholder"]
+            )
+            GeneratedImage.objects.bulk_update(thumbnailed, ["thumbnail", "thumbnail_status"])
+            GeneratedImage.objects.bulk_update(failed, ["thumbnail_status"])
+            replace_renditions([image.pk for image in ready], renditions)
+        # bulk_update sends no post_save, so collection ETags are bumped here
+        bump_version(COLLECTION)
+        return len(ready), len(thumbnailed) + len(failed)
+
+    def report(self, done, failed, start, last_id):
+        elapsed = time.monotonic() - start
+        rate = done / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"{done} rendered, {failed} failed, {rate:.1f} images/s (last id {last_id})"
+        )
@@ -0,0 +1,64 @@
+import statistics
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from gatchalife.generated_image.models import THUMBNAIL_SIZE
+from gatchalife.generated_image.renditions import scale_down
+
+
+def synthetic_source(width, height, fmt):
+    """A detailed but smooth (illustration-like) RGB image encoded in `fmt`."""
+    channels = [
+        Image.effect_mandelbrot((width, height), (-2.0, -1.5, 1.0, 1.5), 100),
+        Image.linear_gradient("L").resize((width, height)),
+        Image.effect_mandelbrot((width, height), (-1.0, -1.0, 1.0, 1.0), 50),
+    ]
+    buffer = BytesIO()
+    Image.merge("RGB", channels).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def full_decode(data):
+    # Previous path: the whole image is decoded and converted before shrinking
+    img = Image.open(BytesIO(data)).convert("RGB")
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    return img
+
+
+def scaled_decode(data):
+    img = scale_down(Image.open(BytesIO(data)), THUMBNAIL_SIZE).convert("RGB")
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    return img
+
+
+class Command(BaseCommand):
+    help = "Times thumbnail decode+resize with and without draft()/reduce() scaling."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=2048)
+        parser.add_argument("--height", type=int, default=3072)
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        width, height, runs = options["width"], options["height"], options["runs"]
+        self.stdout.write(f"Source {width}x{height}, thumbnail {THUMBNAIL_SIZE}, {runs} runs")
+
+        for fmt in ("JPEG", "PNG"):
+            data = synthetic_source(width, height, fmt)
+            results = {}
+            for name, path in (("full decode", full_decode), ("draft/reduce", scaled_decode)):
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    path(data)
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = statistics.median(timings)
+
+            before, after = results["full decode"], results["draft/reduce"]
+            self.stdout.write(
+                f"{fmt:>4} ({len(data) // 1024} KB): {before:.1f} ms -> {after:.1f} ms "
+                f"(x{before / after:.1f})"
+            )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('character', '0010_charactervariant_legacy'),
+        ('generated_image', '0004_generatedimage_thumbnail'),
+        ('style', '0005_theme_base_rarity_tier_theme_vibe_tags'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedimage',
+            index=models.Index(fields=['character_variant', 'rarity', 'style', 'theme', '-created_at'], name='generatedimage_card_latest'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+def mark_existing_thumbnails_ready(apps, schema_editor):
+    GeneratedImage = apps.get_model("generated_image", "GeneratedImage")
+    GeneratedImage.objects.exclude(thumbnail="").exclude(thumbnail__isnull=True).update(
+        thumbnail_status="READY"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generated_image', '0005_generatedimage_card_latest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedimage',
+            name='thumbnail_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_thumbnails_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generated_image', '0007_imagerendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedimage',
+            name='placeholder',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
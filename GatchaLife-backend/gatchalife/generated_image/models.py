@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.files.base import ContentFile
 from io import BytesIO
 import os
@@ -7,12 +7,27 @@ from PIL import Image  # Requires pillow
 from gatchalife.character.models import CharacterVariant
 from gatchalife.style.models import Style, Rarity, Theme
 
+THUMBNAIL_SIZE = (300, 450)
+
+
 class GeneratedImage(models.Model):
+    class ThumbnailStatus(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        READY = "READY", "Ready"
+        FAILED = "FAILED", "Failed"
+
     image = models.ImageField(upload_to="generated_images/")
     # Add this field
     thumbnail = models.ImageField(
         upload_to="generated_images/thumbnails/", null=True, blank=True
     )
+    # Thumbnails are rendered by a Celery task once the image is stored;
+    # until READY, readers fall back to the full image.
+    thumbnail_status = models.CharField(
+        max_length=20, choices=ThumbnailStatus.choices, default=ThumbnailStatus.PENDING
+    )
+    # Tiny inline data URI (LQIP) shown while the image downloads, set with the renditions
+    placeholder = models.TextField(blank=True, default="")
 
     character_variant = models.ForeignKey(CharacterVariant, on_delete=models.CASCADE)
     rarity = models.ForeignKey(Rarity, on_delete=models.CASCADE)
@@ -20,35 +35,82 @@ class GeneratedImage(models.Model):
     theme = models.ForeignKey(Theme, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Latest image per card: WHERE variant/rarity/style/theme ORDER BY -created_at
+            models.Index(
+                fields=["character_variant", "rarity", "style", "theme", "-created_at"],
+                name="generatedimage_card_latest",
+            ),
+        ]
+
     def __str__(self):
         return f"GeneratedImage {self.id} at {self.created_at}"
 
     def save(self, *args, **kwargs):
-        # Automatically generate thumbnail if missing
-        if self.image and not self.thumbnail:
-            self.generate_thumbnail()
         super().save(*args, **kwargs)
+        # Queue the thumbnail once the image is stored (rendered by tasks.generate_thumbnail)
+        if (
+            self.image
+            and not self.thumbnail
+            and self.thumbnail_status == self.ThumbnailStatus.PENDING
+        ):
+            from .tasks import enqueue_thumbnail
+
+            image_id = self.pk
+            transaction.on_commit(lambda: enqueue_thumbnail(image_id))
 
     def generate_thumbnail(self):
-        try:
-            img = Image.open(self.image)
-            # Convert to RGB if necessary (e.g. for PNG with transparency handling)
-            if img.mode != "RGBA":
-                img = img.convert("RGB")
-
-            # Resize to a reasonable card width (e.g., 300px width)
-            # Maintain aspect ratio
-            img.thumbnail((300, 450), Image.Resampling.LANCZOS)
-
-            thumb_io = BytesIO()
-            # Save as PNG to preserve quality/transparency
-            img.save(thumb_io, format="PNG", optimize=True)
-
-            thumb_filename = f"thumb_{os.path.basename(self.image.name)}"
-            # Save=False to avoid infinite recursion loop in save()
-            self.thumbnail.save(
-                thumb_filename, ContentFile(thumb_io.getvalue()), save=False
-            )
-        except Exception as e:
-            # Log error but don't crash save
-            print(f"Error generating thumbnail: {e}")
\ No newline at end of file
+        """
+        Renders the thumbnail into self.thumbnail (not saved). Raises on
+        unreadable images.
+        """
+        from .renditions import scale_down
+
+        # Shrink before converting, so multi-megapixel sources are never
+        # converted (or resampled) at full resolution
+        img = scale_down(Image.open(self.image), THUMBNAIL_SIZE)
+        # Convert to RGB if necessary (e.g. for PNG with transparency handling)
+        if img.mode != "RGBA":
+            img = img.convert("RGB")
+
+        # Resize to a reasonable card width (e.g., 300px width)
+        # Maintain aspect ratio
+        img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+
+        thumb_io = BytesIO()
+        # Save as PNG to preserve quality/transparency
+        img.save(thumb_io, format="PNG", optimize=True)
+
+        thumb_filename = f"thumb_{os.path.basename(self.image.name)}"
+        # Save=False to avoid infinite recursion loop in save()
+        self.thumbnail.save(
+            thumb_filename, ContentFile(thumb_io.getvalue()), save=False
+        )
+
+
+class ImageRendition(models.Model):
+    """
+    Resized, re-encoded copy of a GeneratedImage (see renditions.py), served to
+    clients as a srcset candidate.
+    """
+
+    class Format(models.TextChoices):
+        WEBP = "webp", "WebP"
+        AVIF = "avif", "AVIF"
+
+    image = models.ForeignKey(
+        GeneratedImage, on_delete=models.CASCADE, related_name="renditions"
+    )
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10, choices=Format.choices)
+    file = models.ImageField(upload_to="generated_images/renditions/")
+    file_size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("image", "width", "format")
+
+    def __str__(self):
+        return f"{self.image} {self.width}w {self.format}"
@@ -0,0 +1,110 @@
+"""
+Cache of base64-encoded reference images sent to the N8N generation workflow.
+
+Entries are content-addressed by storage name + modification time + size, so a
+replaced file gets a new key and stale entries simply age out of the LRU.
+The in-process LRU is capped by REFERENCE_IMAGE_CACHE_MAX_BYTES; setting
+REFERENCE_IMAGE_CACHE_ALIAS to a Django cache alias (e.g. the Redis-backed
+"default") additionally shares entries between workers.
+"""
+
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+class ReferenceImageCache:
+    def __init__(self, max_bytes, shared_alias=None, shared_timeout=None):
+        self.max_bytes = max_bytes
+        self.shared_alias = shared_alias
+        self.shared_timeout = shared_timeout
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    @staticmethod
+    def cache_key(image_field):
+        """
+        Returns a stable key for the file behind `image_field`, or None when the
+        storage can't report mtime/size (the file then gets hashed on read).
+        """
+        storage = image_field.storage
+        name = image_field.name
+        try:
+            mtime = storage.get_modified_time(name).timestamp()
+            size = storage.size(name)
+        except (NotImplementedError, OSError):
+            return None
+        return f"refimg:{name}:{mtime}:{size}"
+
+    def _get_local(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def get_or_encode(self, image_field):
+        if not image_field:
+            return None
+
+        key = self.cache_key(image_field)
+        if key is not None:
+            value = self._get_local(key)
+            if value is None and self._shared():
+                value = self._shared().get(key)
+                if value is not None:
+                    self._set_local(key, value)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        with image_field.open("rb") as f:
+            raw = f.read()
+
+        if key is None:
+            key = f"refimg:sha256:{hashlib.sha256(raw).hexdigest()}"
+            value = self._get_local(key)
+            if value is not None:
+                return value
+
+        value = base64.b64encode(raw).decode("utf-8")
+        self._set_local(key, value)
+        if self._shared():
+            self._shared().set(key, value, timeout=self.shared_timeout)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+reference_image_cache = ReferenceImageCache(
+    max_bytes=getattr(settings, "REFERENCE_IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    shared_alias=getattr(settings, "REFERENCE_IMAGE_CACHE_ALIAS", None),
+    shared_timeout=getattr(settings, "REFERENCE_IMAGE_CACHE_TIMEOUT", 60 * 60 * 24),
+)
@@ -0,0 +1,173 @@
+"""
+Multi-size renditions of generated card art.
+
+Each GeneratedImage is re-encoded at IMAGE_RENDITION_WIDTHS (1x/2x/3x of the
+collection grid's card width) in every IMAGE_RENDITION_FORMATS format Pillow
+can encode here. Renditions are rendered by the thumbnail task
+(tasks.generate_thumbnail) and exposed to clients as srcset candidates, so a
+grid cell downloads a few KB of WebP instead of the full-size PNG.
+"""
+
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+from .models import ImageRendition
+
+# Sources are shrunk cheaply (JPEG DCT scaling, box reduce()) down to at least
+# this many times the target size; the final LANCZOS resample does the rest.
+REDUCING_GAP = 2
+
+# Modes reduce() can't handle, and what they are converted to first
+# (palette images keep their transparency)
+REDUCE_CONVERSIONS = {"1": "L", "I;16": "L", "I;16B": "L", "I;16L": "L", "I;16N": "L"}
+
+# Inline placeholder (LQIP) painted while the real image downloads
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 40
+
+# Pillow encoder options per format
+ENCODER_OPTIONS = {
+    ImageRendition.Format.WEBP: {"method": 4},
+    ImageRendition.Format.AVIF: {"speed": 8},
+}
+
+
+def rendition_widths():
+    return sorted(set(getattr(settings, "IMAGE_RENDITION_WIDTHS", (150, 300, 600))))
+
+
+def rendition_formats():
+    """Configured formats, minus those this Pillow build can't encode."""
+    formats = getattr(settings, "IMAGE_RENDITION_FORMATS", (ImageRendition.Format.WEBP,))
+    return [f for f in formats if f in ENCODER_OPTIONS and features.check(f)]
+
+
+def encode(img, fmt):
+    buffer = BytesIO()
+    img.save(
+        buffer,
+        format=fmt.upper(),
+        quality=getattr(settings, "IMAGE_RENDITION_QUALITY", 75),
+        **ENCODER_OPTIONS[fmt],
+    )
+    return buffer.getvalue()
+
+
+def scale_down(img, size):
+    """
+    Shrinks a freshly opened (not yet loaded) image to no less than REDUCING_GAP
+    times the `size` (width, height) box, as cheaply as the format allows.
+    JPEG sources are decoded directly at 1/2, 1/4 or 1/8 scale (draft mode);
+    other formats are decoded, then shrunk by an integer factor with reduce(),
+    which is much cheaper than resampling the full resolution. Modes reduce()
+    doesn't support (palette, bilevel, 16-bit) are converted first.
+    """
+    floor = (size[0] * REDUCING_GAP, size[1] * REDUCING_GAP)
+    if img.format == "JPEG":
+        img.draft("RGB", floor)
+    factor = min(img.width // floor[0], img.height // floor[1])
+    if factor > 1:
+        if img.mode == "P":
+            img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+        elif img.mode in REDUCE_CONVERSIONS:
+            img = img.convert(REDUCE_CONVERSIONS[img.mode])
+        img = img.reduce(factor)
+    return img
+
+
+def build_placeholder(img):
+    """
+    A ~20px wide WebP of `img` as a data URI (a few hundred bytes), small enough
+    to be returned inline with every card.
+    """
+    width = min(PLACEHOLDER_WIDTH, img.width)
+    height = max(1, round(img.height * width / img.width))
+    small = img.resize((width, height), Image.Resampling.BOX)
+
+    buffer = BytesIO()
+    if features.check("webp"):
+        small.save(buffer, format="WEBP", quality=PLACEHOLDER_QUALITY)
+        mime = "image/webp"
+    else:
+        small.save(buffer, format="PNG", optimize=True)
+        mime = "image/png"
+    return f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def build_renditions(generated_image):
+    """
+    Renders and stores the rendition files of a GeneratedImage, without touching
+    the database (the backfill command runs this in worker processes).
+    Returns unsaved ImageRendition rows and sets generated_image.placeholder
+    (not saved). Widths larger than the source are clamped to it rather than
+    upscaled.
+    """
+    formats = rendition_formats()
+    source = Image.open(generated_image.image)
+    source_width, source_height = source.size
+    widths = sorted({min(w, source_width) for w in rendition_widths()})
+    largest = (widths[-1], max(1, round(source_height * widths[-1] / source_width)))
+
+    source = scale_down(source, largest)
+    if source.mode not in ("RGB", "RGBA"):
+        source = source.convert("RGBA" if source.has_transparency_data else "RGB")
+
+    stem = os.path.splitext(os.path.basename(generated_image.image.name))[0]
+    renditions = []
+    for width in widths:
+        height = max(1, round(source_height * width / source_width))
+        resized = source.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            data = encode(resized, fmt)
+            rendition = ImageRendition(
+                image_id=generated_image.pk,
+                width=width,
+                height=height,
+                format=fmt,
+                file_size=len(data),
+            )
+            rendition.file.save(f"{stem}_{width}w.{fmt}", ContentFile(data), save=False)
+            renditions.append(rendition)
+
+    generated_image.placeholder = build_placeholder(source)
+    return renditions
+
+
+def replace_renditions(image_ids, renditions):
+    """Swaps the stored renditions of `image_ids` for `renditions`."""
+    old = ImageRendition.objects.filter(image_id__in=image_ids)
+    for rendition in old:
+        rendition.file.delete(save=False)
+    old.delete()
+    return ImageRendition.objects.bulk_create(renditions)
+
+
+def render_renditions(generated_image):
+    """
+    (Re)builds the renditions of a GeneratedImage and returns them.
+    The caller saves the placeholder.
+    """
+    return replace_renditions([generated_image.pk], build_renditions(generated_image))
+
+
+def rendition_srcsets(image_ids):
+    """
+    Returns {image_id: {format: [(relative url, width), ...]}}, widths ascending,
+    with a single query.
+    """
+    srcsets = {}
+    rows = (
+        ImageRendition.objects.filter(image_id__in=image_ids)
+        .order_by("width")
+        .values_list("image_id", "format", "file", "width")
+    )
+    for image_id, fmt, file, width in rows:
+        srcsets.setdefault(image_id, {}).setdefault(fmt, []).append(
+            (settings.MEDIA_URL + file, width)
+        )
+    return srcsets
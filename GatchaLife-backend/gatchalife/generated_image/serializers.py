@@ -7,10 +7,13 @@ logger = structlog.get_logger(__name__)
 
 from .models import GeneratedImage
 from .services import generate_image
+from gatchalife.character.config_index import get_config_index
 from gatchalife.style.models import Style, Rarity, Theme
 
 
 class GeneratedImageSerializer(serializers.ModelSerializer):
+    thumbnail_url = serializers.SerializerMethodField()
+
     class Meta:
         model = GeneratedImage
         fields = [
@@ -21,8 +24,21 @@ class GeneratedImageSerializer(serializers.ModelSerializer):
             "style",
             "theme",
             "created_at",
+            "thumbnail_url",
+            "thumbnail_status",
+            "placeholder",
+        ]
+        read_only_fields = [
+            "created_at", "image", "rarity", "style", "theme", "thumbnail_status", "placeholder"
         ]
-        read_only_fields = ["created_at", "image", "rarity", "style", "theme"]
+
+    def get_thumbnail_url(self, obj):
+        # Full image until the thumbnail task has rendered it
+        image = obj.thumbnail or obj.image
+        if not image:
+            return None
+        request = self.context.get("request")
+        return request.build_absolute_uri(image.url) if request else image.url
 
     def create(self, validated_data):
         # 1. Roll for Rarity
@@ -45,7 +61,8 @@ class GeneratedImageSerializer(serializers.ModelSerializer):
 
         # Filter configs for the rolled rarity
         matching_configs = [
-            c for c in configs if c.get("rarity", "").upper() == rarity.name.upper()
+            e.config
+            for e in get_config_index(variant).by_rarity.get(rarity.name.upper(), [])
         ]
         logger.debug(
             "Matching configurations found for rarity",
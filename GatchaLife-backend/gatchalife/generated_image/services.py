@@ -1,12 +1,19 @@
-import requests
-import base64
 import mimetypes
+from urllib.parse import urlsplit
 from django.conf import settings
+from django.core import signing
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
 import structlog
 
 logger = structlog.get_logger(__name__)
 
 from .models import GeneratedImage
+from gatchalife.workflow_engine import n8n
+from .reference_cache import reference_image_cache
+from .renditions import rendition_srcsets
+from gatchalife.character.config_index import get_config_index
 from gatchalife.character.models import CharacterVariant
 from gatchalife.character.serializers import (
     CharacterVariantSerializer,
@@ -20,45 +27,180 @@ def match_card_configuration(variant, rarity, style, theme):
     """
     Finds the specific card configuration that matches the given rarity, style, and theme
     for a character variant.
+    If a config has a style (or theme), it must match; a config without one accepts any.
     """
-    configs = variant.card_configurations_data or []
+    entry = get_config_index(variant).match(
+        rarity.name,
+        style.name if style else None,
+        theme.name if theme else None,
+    )
+    return entry.config if entry else None
+
+
+def image_urls(image, thumbnail, renditions=None, placeholder=""):
+    """
+    Builds an image_map entry from the raw image/thumbnail storage names.
+    The thumbnail falls back to the full image while it is pending (or failed).
+    `renditions` is {format: [(url, width), ...]} (see renditions.rendition_srcsets),
+    `placeholder` the inline LQIP data URI ("" until rendered).
+    """
+    image_url = settings.MEDIA_URL + image if image else None
+    thumbnail_url = settings.MEDIA_URL + thumbnail if thumbnail else image_url
+    return {
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
+        "renditions": renditions or {},
+        "placeholder": placeholder or None,
+    }
+
+
+def latest_image_map(keys):
+    """
+    Returns {(variant_id, rarity_id, style_id, theme_id): image_map entry} for the
+    most recent GeneratedImage of each key, with a single query served by the
+    generatedimage_card_latest index. Older rerolls are ranked out in SQL.
+    Keys without an image are absent. Renditions of the images whose thumbnail
+    task has completed are fetched with one more query.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    # Only the newest row of each key leaves the database, however many rerolls exist
+    rows = (
+        GeneratedImage.objects.filter(
+            character_variant_id__in={k[0] for k in keys},
+            rarity_id__in={k[1] for k in keys},
+            style_id__in={k[2] for k in keys},
+            theme_id__in={k[3] for k in keys},
+        )
+        .annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=[
+                    F("character_variant_id"),
+                    F("rarity_id"),
+                    F("style_id"),
+                    F("theme_id"),
+                ],
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(recency=1)
+        .values_list(
+            "character_variant_id",
+            "rarity_id",
+            "style_id",
+            "theme_id",
+            "image",
+            "thumbnail",
+            "id",
+            "thumbnail_status",
+            "placeholder",
+        )
+    )
+    rows = [row for row in rows if row[:4] in keys]
 
-    for c in configs:
-        # Check Rarity
-        if c.get("rarity", "").upper() != rarity.name.upper():
-            continue
+    ready = [row[6] for row in rows if row[7] == GeneratedImage.ThumbnailStatus.READY]
+    srcsets = rendition_srcsets(ready) if ready else {}
 
-        # Check Style
-        # If config has a style, it MUST match. If config has no style, it accepts any style?
-        # Usually config determines the style. So if config has style, we check equality.
-        c_style = c.get("style", {}).get("name", "")
-        if c_style and style and c_style.strip().lower() != style.name.strip().lower():
-            continue
+    image_map = {}
+    for v_id, r_id, s_id, t_id, image, thumbnail, image_id, _, placeholder in rows:
+        image_map[(v_id, r_id, s_id, t_id)] = image_urls(
+            image, thumbnail, srcsets.get(image_id), placeholder
+        )
+    return image_map
 
-        # Check Theme
-        c_theme = c.get("theme", {}).get("name", "")
-        if c_theme and theme and c_theme.strip().lower() != theme.name.strip().lower():
-            continue
 
-        # Found match
-        return c
+REFERENCE_MEDIA_SALT = "gatchalife.generated_image.reference_media"
 
+
+def sign_reference_media(name):
+    return signing.dumps(name, salt=REFERENCE_MEDIA_SALT)
+
+
+def unsign_reference_media(token):
+    """
+    Returns the storage name behind a signed reference media token.
+    Raises signing.BadSignature (or SignatureExpired) for invalid tokens.
+    """
+    return signing.loads(
+        token,
+        salt=REFERENCE_MEDIA_SALT,
+        max_age=getattr(settings, "REFERENCE_MEDIA_URL_MAX_AGE", 60 * 60),
+    )
+
+
+def reference_media_url(image_field, base_url):
+    if not image_field:
+        return None
+    path = reverse("reference-media", args=[sign_reference_media(image_field.name)])
+    return f"{base_url.rstrip('/')}{path}"
+
+
+def _media_base_url(callback_url):
+    base_url = getattr(settings, "N8N_MEDIA_BASE_URL", None)
+    if base_url:
+        return base_url
+    if callback_url:
+        parts = urlsplit(callback_url)
+        return f"{parts.scheme}://{parts.netloc}"
     return None
 
 
-def generate_image(
-    character_variant: CharacterVariant,
-    rarity: Rarity,
-    style: Style,
-    theme: Theme,
-    pose: str = None,
-    card_configuration: dict = None,
-    callback_url: str = None,
-) -> GeneratedImage:
+def create_generation_jobs(combinations):
+    """
+    Creates the GeneratedImage placeholders and their PENDING AsyncJobs for the given
+    (variant, rarity, style, theme, config) combinations with two bulk inserts.
+    Nothing is sent to N8N here; see dispatch_generation_job.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from gatchalife.workflow_engine.models import AsyncJob
+
+    if not combinations:
+        return []
+
+    images = GeneratedImage.objects.bulk_create(
+        [
+            GeneratedImage(character_variant=variant, rarity=r, style=s, theme=t)
+            for (variant, r, s, t, config) in combinations
+        ]
+    )
+
+    content_type = ContentType.objects.get_for_model(GeneratedImage)
+    return AsyncJob.objects.bulk_create(
+        [
+            AsyncJob(
+                job_type="generate_image",
+                content_type=content_type,
+                object_id=str(image.pk),
+                payload={
+                    "pose": (config or {}).get("pose"),
+                    "card_configuration": config,
+                },
+            )
+            for image, (variant, r, s, t, config) in zip(images, combinations)
+        ]
+    )
+
+
+def dispatch_generation_job(job, callback_url: str = None) -> GeneratedImage:
+    """
+    Builds the N8N payload for a generate_image AsyncJob and triggers the workflow.
+    """
+    from gatchalife.workflow_engine.models import AsyncJob
+
+    image_instance = job.content_object
+    pose = job.payload.get("pose")
+    card_configuration = job.payload.get("card_configuration")
+    rarity = image_instance.rarity
+    style = image_instance.style
+    theme = image_instance.theme
+
     # Trigger N8N workflow to generate image
-    n8n_url = f"{settings.N8N_BASE_URL}/{settings.N8N_WORKFLOW_WEBHOOK_PATH}/{settings.N8N_GENERATE_IMAGE_WORKFLOW_ID}"
+    n8n_url = n8n.webhook_url(settings.N8N_GENERATE_IMAGE_WORKFLOW_ID)
 
-    character_variant_instance = character_variant
+    character_variant_instance = image_instance.character_variant
     character_instance = character_variant_instance.character
 
     character_variant_data = CharacterVariantSerializer(character_variant_instance).data
@@ -71,78 +213,76 @@ def generate_image(
         if not image_field:
             return None
         try:
-            with image_field.open("rb") as f:
-                return base64.b64encode(f.read()).decode("utf-8")
+            return reference_image_cache.get_or_encode(image_field)
         except Exception as e:
             logger.error(f"Failed to encode image: {e}")
             return None
 
-    # Base64 encode Character Variant Reference Images (Existing logic)
-    encoded_images_list = []
+    # In "url" mode N8N downloads the references through short-lived signed URLs,
+    # so nothing is read or encoded here whatever the number of reference images.
+    transport = getattr(settings, "N8N_REFERENCE_IMAGE_TRANSPORT", "base64")
+    base_url = _media_base_url(callback_url) if transport == "url" else None
+    if transport == "url" and not base_url:
+        logger.warning("No media base URL available, falling back to base64 references")
+        transport = "base64"
+
+    def reference_image(image_field):
+        if transport == "url":
+            return {"url": reference_media_url(image_field, base_url)}
+        encoded_data = encode_image_field(image_field)
+        return {"data": encoded_data} if encoded_data else None
+
+    # Character Variant Reference Images
+    reference_images_list = []
 
     # Force fetch images if lazy (though .all() does that)
     ref_images = character_variant_instance.images.all()
 
     for image_ref in ref_images:
-         encoded_data = encode_image_field(image_ref.image)
-         if encoded_data:
+        reference = reference_image(image_ref.image)
+        if reference:
             mimetype, _ = mimetypes.guess_type(image_ref.image.name)
-            encoded_images_list.append({
+            reference_images_list.append({
                 "filename": image_ref.image.name,
                 "mimetype": mimetype or "image/png",
-                "data": encoded_data,
+                **reference,
             })
 
     logger.info(
-        "Encoded reference images for generation",
+        "Prepared reference images for generation",
         variant=character_variant_instance.name,
-        count=len(encoded_images_list),
+        count=len(reference_images_list),
+        transport=transport,
     )
-    
-    # Base64 encode Specific Reference (Variant)
-    specific_ref_b64 = encode_image_field(character_variant_instance.specific_reference_image)
 
-    # Prepare Prioritized Identity Face / Variant Reference as Base64
+    # Prepare Prioritized Identity Face / Variant Reference
     # Priority: Variant Specific Reference > Character Identity Face
-    # This will be sent as 'identity_face_image_b64' in the root or character object for N8N to use
-    
-    final_identity_image_b64 = None
-    
-    # Check Variant Specific Reference First
+    # This will be sent as 'identity_face_image_b64' (or '_url') in the character object for N8N to use
+    specific_ref = None
     if character_variant_instance.specific_reference_image:
-        final_identity_image_b64 = encode_image_field(character_variant_instance.specific_reference_image)
-    
-    # Fallback to Character Identity Face
-    if not final_identity_image_b64 and character_instance.identity_face_image:
-         final_identity_image_b64 = encode_image_field(character_instance.identity_face_image)
-
-    # Create GeneratedImage instance first
-    image_instance = GeneratedImage.objects.create(
-        character_variant=character_variant_instance,
-        rarity=rarity,
-        style=style,
-        theme=theme,
-    )
+        specific_ref = reference_image(character_variant_instance.specific_reference_image)
 
-    # Create Async Job
-    from gatchalife.workflow_engine.models import AsyncJob
+    identity_ref = specific_ref
+    if not identity_ref and character_instance.identity_face_image:
+        identity_ref = reference_image(character_instance.identity_face_image)
 
-    job = AsyncJob.objects.create(
-        job_type="generate_image", content_object=image_instance, payload={"pose": pose}
-    )
+    value_key, suffix = ("url", "url") if transport == "url" else ("data", "b64")
+    specific_ref_value = (specific_ref or {}).get(value_key)
+    identity_value = (identity_ref or {}).get(value_key)
 
     payload = {
         "job_id": str(job.id),
         "callback_url": callback_url,
+        "reference_transport": transport,
         "character_variant": {
             **character_variant_data,
-            "images": encoded_images_list,
-            "specific_reference_image_b64": specific_ref_b64,
+            "images": reference_images_list,
+            f"specific_reference_image_{suffix}": specific_ref_value,
         },
         "character": {
             **character_data,
             # We explicitly override/set this field for the N8N workflow to easily pick it up
-            "identity_face_image_b64": final_identity_image_b64,
+            f"identity_face_image_{suffix}": identity_value,
         },
         "rarity": RaritySerializer(rarity).data,
         "style": StyleSerializer(style).data,
@@ -151,11 +291,11 @@ def generate_image(
         },
         "pose": pose,
         "card_configuration": card_configuration,
-        "identity_face_image": final_identity_image_b64,
+        "identity_face_image": identity_value,
     }
 
     try:
-        requests.post(n8n_url, json=payload, timeout=5)
+        n8n.post(n8n_url, name="generate_image", json=payload)
         job.status = AsyncJob.Status.PROCESSING
         job.save()
     except Exception as e:
@@ -165,3 +305,36 @@ def generate_image(
         job.save()
 
     return image_instance
+
+
+def generate_image(
+    character_variant: CharacterVariant,
+    rarity: Rarity,
+    style: Style,
+    theme: Theme,
+    pose: str = None,
+    card_configuration: dict = None,
+    callback_url: str = None,
+) -> GeneratedImage:
+    """
+    Creates the generation job and triggers N8N synchronously.
+    Request paths should prefer create_generation_jobs + tasks.enqueue_image_generation.
+    """
+    # Create GeneratedImage instance first
+    image_instance = GeneratedImage.objects.create(
+        character_variant=character_variant,
+        rarity=rarity,
+        style=style,
+        theme=theme,
+    )
+
+    # Create Async Job
+    from gatchalife.workflow_engine.models import AsyncJob
+
+    job = AsyncJob.objects.create(
+        job_type="generate_image",
+        content_object=image_instance,
+        payload={"pose": pose, "card_configuration": card_configuration},
+    )
+
+    return dispatch_generation_job(job, callback_url=callback_url)
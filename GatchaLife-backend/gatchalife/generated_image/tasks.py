@@ -0,0 +1,76 @@
+from celery import shared_task
+import structlog
+
+from gatchalife.workflow_engine.models import AsyncJob
+from .models import GeneratedImage
+from .renditions import render_renditions
+from .services import dispatch_generation_job
+
+logger = structlog.get_logger(__name__)
+
+
+@shared_task
+def dispatch_image_generation(job_id, callback_url=None):
+    """
+    Sends a PENDING generate_image job to N8N outside of the request cycle.
+    """
+    job = AsyncJob.objects.filter(
+        id=job_id, job_type="generate_image", status=AsyncJob.Status.PENDING
+    ).first()
+    if not job:
+        logger.warning("image_generation_job_not_pending", job_id=job_id)
+        return
+
+    dispatch_generation_job(job, callback_url=callback_url)
+
+
+def enqueue_image_generation(jobs, callback_url=None):
+    """
+    Queues dispatch_image_generation for each job.
+    Jobs that cannot be queued (e.g. broker down) are marked FAILED.
+    """
+    for job in jobs:
+        try:
+            dispatch_image_generation.delay(str(job.id), callback_url)
+        except Exception as e:
+            logger.error("image_generation_enqueue_failed", job_id=str(job.id), error=str(e))
+            job.status = AsyncJob.Status.FAILED
+            job.error_message = str(e)
+            job.save()
+
+
+@shared_task
+def generate_thumbnail(image_id):
+    """
+    Renders the thumbnail and the srcset renditions (see renditions.py) of a
+    stored GeneratedImage outside of the request (and N8N callback) cycle.
+    """
+    image = GeneratedImage.objects.filter(
+        id=image_id, thumbnail_status=GeneratedImage.ThumbnailStatus.PENDING
+    ).first()
+    if not image or not image.image:
+        return
+
+    try:
+        image.generate_thumbnail()
+        image.thumbnail_status = GeneratedImage.ThumbnailStatus.READY
+    except Exception as e:
+        logger.error("thumbnail_generation_failed", image_id=image_id, error=str(e))
+        image.thumbnail_status = GeneratedImage.ThumbnailStatus.FAILED
+        image.save(update_fields=["thumbnail_status"])
+        return
+
+    try:
+        render_renditions(image)
+    except Exception as e:
+        # The thumbnail stays usable; backfill_renditions picks the image up again
+        logger.error("rendition_generation_failed", image_id=image_id, error=str(e))
+    image.save(update_fields=["thumbnail", "thumbnail_status", "placeholder"])
+
+
+def enqueue_thumbnail(image_id):
+    try:
+        generate_thumbnail.delay(image_id)
+    except Exception as e:
+        # Stays PENDING, readers keep using the full image
+        logger.error("thumbnail_enqueue_failed", image_id=image_id, error=str(e))
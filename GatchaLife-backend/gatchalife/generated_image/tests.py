@@ -1,3 +1,302 @@
-from django.test import TestCase
+import base64
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from gatchalife.character.models import Series, Character, CharacterVariant
+from gatchalife.style.models import Rarity, Style, Theme
+from gatchalife.workflow_engine.models import AsyncJob
+from .models import GeneratedImage, ImageRendition
+from .renditions import scale_down
+from .reference_cache import ReferenceImageCache, reference_image_cache
+from .services import create_generation_jobs, latest_image_map
+from .tasks import dispatch_image_generation
 
-# Create your tests here.
+
+class ImageGenerationTaskTests(TestCase):
+    def setUp(self):
+        self.rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        self.series = Series.objects.create(name="S1")
+        self.char = Character.objects.create(name="C1", series=self.series)
+        self.variant = CharacterVariant.objects.create(name="V1", character=self.char)
+        self.style = Style.objects.create(name="St1", rarity=self.rarity)
+        self.theme = Theme.objects.create(name="Th1")
+
+    def test_create_generation_jobs(self):
+        jobs = create_generation_jobs([
+            (self.variant, self.rarity, self.style, self.theme, {"pose": "wave"}),
+        ])
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].status, AsyncJob.Status.PENDING)
+        self.assertEqual(jobs[0].payload["pose"], "wave")
+        self.assertIsInstance(AsyncJob.objects.get().content_object, GeneratedImage)
+
+    def test_latest_image_map_returns_newest_per_key(self):
+        key = (self.variant.id, self.rarity.id, self.style.id, self.theme.id)
+        GeneratedImage.objects.create(image="generated_images/old.png", **self._fks())
+        GeneratedImage.objects.create(image="generated_images/new.png", **self._fks())
+
+        with self.assertNumQueries(1):
+            image_map = latest_image_map([key, (self.variant.id, self.rarity.id, self.style.id, 0)])
+
+        self.assertEqual(list(image_map), [key])
+        self.assertTrue(image_map[key]["image_url"].endswith("generated_images/new.png"))
+        self.assertEqual(image_map[key]["thumbnail_url"], image_map[key]["image_url"])
+
+    def _fks(self):
+        return dict(character_variant=self.variant, rarity=self.rarity, style=self.style, theme=self.theme)
+
+    @patch('gatchalife.workflow_engine.n8n.post')
+    def test_dispatch_task_triggers_n8n(self, mock_post):
+        (job,) = create_generation_jobs([
+            (self.variant, self.rarity, self.style, self.theme, {"pose": "wave"}),
+        ])
+        dispatch_image_generation(str(job.id), "http://testserver/callback/")
+
+        mock_post.assert_called_once()
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["job_id"], str(job.id))
+        self.assertEqual(payload["pose"], "wave")
+        job.refresh_from_db()
+        self.assertEqual(job.status, AsyncJob.Status.PROCESSING)
+
+        # Already dispatched jobs are not sent twice
+        dispatch_image_generation(str(job.id))
+        mock_post.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReferenceImageCacheTests(TestCase):
+    def setUp(self):
+        reference_image_cache.clear()
+        self.rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        self.series = Series.objects.create(name="S1")
+        self.char = Character.objects.create(name="C1", series=self.series)
+        self.variant = CharacterVariant.objects.create(name="V1", character=self.char)
+        self.variant.specific_reference_image.save("ref.png", ContentFile(b"reference"))
+        self.style = Style.objects.create(name="St1", rarity=self.rarity)
+        self.theme = Theme.objects.create(name="Th1")
+
+    @patch('gatchalife.workflow_engine.n8n.post')
+    def test_reference_images_encoded_once(self, mock_post):
+        jobs = create_generation_jobs([
+            (self.variant, self.rarity, self.style, self.theme, {"pose": "wave"}),
+            (self.variant, self.rarity, self.style, self.theme, {"pose": "sit"}),
+        ])
+        misses = reference_image_cache.misses
+        for job in jobs:
+            dispatch_image_generation(str(job.id))
+
+        # Encoded on the first dispatch only, and reused for the identity image
+        self.assertEqual(reference_image_cache.misses - misses, 1)
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["identity_face_image"], "cmVmZXJlbmNl")
+        self.assertEqual(payload["character_variant"]["specific_reference_image_b64"], "cmVmZXJlbmNl")
+
+    def test_lru_evicts_beyond_max_bytes(self):
+        cache = ReferenceImageCache(max_bytes=20)
+        self.char.identity_face_image.save("face.png", ContentFile(b"face-bytes"))
+
+        cache.get_or_encode(self.variant.specific_reference_image)
+        cache.get_or_encode(self.char.identity_face_image)
+
+        self.assertLessEqual(cache.current_bytes, 20)
+        self.assertEqual(len(cache._entries), 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), N8N_REFERENCE_IMAGE_TRANSPORT="url")
+class ReferenceMediaTransportTests(TestCase):
+    def setUp(self):
+        self.rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        self.series = Series.objects.create(name="S1")
+        self.char = Character.objects.create(name="C1", series=self.series)
+        self.variant = CharacterVariant.objects.create(name="V1", character=self.char)
+        self.variant.specific_reference_image.save("ref.png", ContentFile(b"reference"))
+        self.style = Style.objects.create(name="St1", rarity=self.rarity)
+        self.theme = Theme.objects.create(name="Th1")
+
+    @patch('gatchalife.workflow_engine.n8n.post')
+    def test_payload_carries_signed_urls(self, mock_post):
+        (job,) = create_generation_jobs([
+            (self.variant, self.rarity, self.style, self.theme, {"pose": "wave"}),
+        ])
+        dispatch_image_generation(str(job.id), "http://testserver/webhooks/n8n/callback/")
+
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["reference_transport"], "url")
+        url = payload["character"]["identity_face_image_url"]
+        self.assertTrue(url.startswith("http://testserver/webhooks/n8n/media/"))
+        self.assertNotIn("identity_face_image_b64", payload["character"])
+
+        response = self.client.get(url.replace("http://testserver", ""))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"reference")
+
+    def test_tampered_token_is_rejected(self):
+        response = self.client.get("/webhooks/n8n/media/not-a-token/")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailTaskTests(TestCase):
+    def setUp(self):
+        rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        char = Character.objects.create(name="C1", series=Series.objects.create(name="S1"))
+        self.image = GeneratedImage.objects.create(
+            character_variant=CharacterVariant.objects.create(name="V1", character=char),
+            rarity=rarity,
+            style=Style.objects.create(name="St1", rarity=rarity),
+            theme=Theme.objects.create(name="Th1"),
+        )
+
+    def png(self, size):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, format="PNG")
+        return ContentFile(buffer.getvalue())
+
+    def test_thumbnail_is_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.image.image.save("card.png", self.png((600, 900)), save=True)
+
+        # The save itself doesn't render; readers fall back to the full image
+        self.image.refresh_from_db()
+        self.assertFalse(self.image.thumbnail)
+        key = (self.image.character_variant_id, self.image.rarity_id, self.image.style_id, self.image.theme_id)
+        urls = latest_image_map([key])[key]
+        self.assertEqual(urls["thumbnail_url"], urls["image_url"])
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.thumbnail_status, GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(Image.open(self.image.thumbnail).size, (300, 450))
+
+        renditions = {(r.width, r.format): r for r in self.image.renditions.all()}
+        self.assertEqual(set(renditions), {(150, "webp"), (300, "webp"), (600, "webp")})
+        self.assertEqual(Image.open(renditions[(150, "webp")].file).size, (150, 225))
+
+        srcset = latest_image_map([key])[key]["renditions"]["webp"]
+        self.assertEqual([width for _, width in srcset], [150, 300, 600])
+        self.assertTrue(srcset[0][0].endswith("card_150w.webp"))
+
+        # Inline placeholder, a ~20px WebP
+        placeholder = latest_image_map([key])[key]["placeholder"]
+        self.assertEqual(placeholder, self.image.placeholder)
+        self.assertTrue(placeholder.startswith("data:image/webp;base64,"))
+        self.assertLess(len(placeholder), 1000)
+        data = base64.b64decode(placeholder.split(",", 1)[1])
+        self.assertEqual(Image.open(BytesIO(data)).size, (20, 30))
+
+    def test_large_sources_are_decoded_scaled_down(self):
+        cases = (
+            ("JPEG", "RGB", (1024, 1536)),
+            ("PNG", "RGB", (683, 1024)),
+            # Modes reduce() rejects
+            ("PNG", "P", (683, 1024)),
+            ("PNG", "1", (683, 1024)),
+            ("PNG", "I;16", (683, 1024)),
+        )
+        for fmt, mode, expected in cases:
+            buffer = BytesIO()
+            Image.new(mode, (2048, 3072)).save(buffer, format=fmt)
+            img = scale_down(Image.open(buffer), (300, 450))
+            self.assertEqual(img.size, expected)
+
+    def test_palette_png_gets_thumbnail_and_renditions(self):
+        buffer = BytesIO()
+        Image.new("RGB", (2000, 3000), "red").convert("P").save(buffer, format="PNG")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.image.save("palette.png", ContentFile(buffer.getvalue()), save=True)
+
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.thumbnail_status, GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(self.image.renditions.count(), 3)
+        self.assertTrue(self.image.placeholder)
+
+    def test_unreadable_image_is_marked_failed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.image.save("card.png", ContentFile(b"not an image"), save=True)
+
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.thumbnail_status, GeneratedImage.ThumbnailStatus.FAILED)
+        self.assertFalse(self.image.thumbnail)
+
+    @patch('gatchalife.generated_image.renditions.encode', side_effect=OSError("encoder broke"))
+    def test_rendition_failure_keeps_the_thumbnail(self, mock_encode):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.image.save("no_renditions.png", self.png((600, 900)), save=True)
+
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.thumbnail_status, GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(Image.open(self.image.thumbnail).size, (300, 450))
+        self.assertFalse(self.image.renditions.exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BackfillRenditionsTests(TestCase):
+    def setUp(self):
+        rarity, _ = Rarity.objects.get_or_create(name="Common", defaults={'min_roll_threshold': 0})
+        char = Character.objects.create(name="C1", series=Series.objects.create(name="S1"))
+        self.fks = dict(
+            character_variant=CharacterVariant.objects.create(name="V1", character=char),
+            rarity=rarity,
+            style=Style.objects.create(name="St1", rarity=rarity),
+            theme=Theme.objects.create(name="Th1"),
+        )
+
+    def make_image(self, name, content):
+        image = GeneratedImage(**self.fks)
+        image.image.save(name, ContentFile(content), save=True)
+        return image
+
+    def test_backfill_renders_pending_images_and_is_resumable(self):
+        buffer = BytesIO()
+        Image.new("RGB", (600, 900), "red").save(buffer, format="PNG")
+        first = self.make_image("first.png", buffer.getvalue())
+        broken = self.make_image("broken.png", b"not an image")
+        second = self.make_image("second.png", buffer.getvalue())
+
+        out = StringIO()
+        call_command("backfill_renditions", workers=0, batch_size=2, stdout=out, stderr=StringIO())
+        self.assertIn("Rendered 2 images (1 failed)", out.getvalue())
+
+        statuses = dict(GeneratedImage.objects.values_list("id", "thumbnail_status"))
+        self.assertEqual(statuses[first.id], GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(statuses[broken.id], GeneratedImage.ThumbnailStatus.FAILED)
+        self.assertEqual(statuses[second.id], GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(ImageRendition.objects.filter(image=second).count(), 3)
+        second.refresh_from_db()
+        self.assertTrue(second.thumbnail)
+        self.assertTrue(second.placeholder.startswith("data:image/webp;base64,"))
+
+        # Nothing left to do on a rerun
+        out = StringIO()
+        call_command("backfill_renditions", workers=0, stdout=out)
+        self.assertIn("Rendered 0 images (0 failed)", out.getvalue())
+
+    @patch('gatchalife.generated_image.renditions.encode', side_effect=OSError("encoder broke"))
+    def test_rendition_failure_keeps_a_ready_thumbnail(self, mock_encode):
+        buffer = BytesIO()
+        Image.new("RGB", (600, 900), "red").save(buffer, format="PNG")
+        image = self.make_image("thumbnailed.png", buffer.getvalue())
+        image.generate_thumbnail()
+        image.thumbnail_status = GeneratedImage.ThumbnailStatus.READY
+        image.save(update_fields=["thumbnail", "thumbnail_status"])
+        thumbnail = image.thumbnail.name
+
+        out, err = StringIO(), StringIO()
+        call_command("backfill_renditions", workers=0, stdout=out, stderr=err)
+        self.assertIn("Rendered 0 images (1 failed)", out.getvalue())
+        self.assertIn("renditions: encoder broke", err.getvalue())
+
+        image.refresh_from_db()
+        self.assertEqual(image.thumbnail_status, GeneratedImage.ThumbnailStatus.READY)
+        self.assertEqual(image.thumbnail.name, thumbnail)
+
+    @override_settings(IMAGE_RENDITION_FORMATS=("bmp",))
+    def test_backfill_refuses_to_run_without_an_encodable_format(self):
+        with self.assertRaises(CommandError):
+            call_command("backfill_renditions", workers=0, stdout=StringIO())
@@ -1,9 +1,14 @@
 from rest_framework import viewsets, filters, permissions
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.views import View
 
 from .models import GeneratedImage
 from .serializers import GeneratedImageSerializer
+from .services import unsign_reference_media
 
 
 class GeneratedImageViewSet(viewsets.ModelViewSet):
@@ -16,3 +21,20 @@ class GeneratedImageViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["id"]
     search_fields = ["id"]
+
+
+class ReferenceMediaView(View):
+    """
+    Streams a reference image to N8N from a signed, expiring token
+    (see N8N_REFERENCE_IMAGE_TRANSPORT = "url").
+    """
+
+    def get(self, request, token):
+        try:
+            name = unsign_reference_media(token)
+        except signing.BadSignature:
+            raise Http404("Invalid or expired reference media link")
+
+        if not default_storage.exists(name):
+            raise Http404("Reference media not found")
+        return FileResponse(default_storage.open(name, "rb"))
@@ -35,6 +35,28 @@ N8N_GENERATE_IMAGE_WORKFLOW_ID = "generate-image"
 N8N_CHARACTER_WEBHOOK_URL = "profiler"
 N8N_CREATE_VARIANTS_WEBHOOK_URL = "varianter"
 
+# Pooled N8N client (see gatchalife.workflow_engine.n8n). Size the pool to the
+# gunicorn threads / concurrent generation dispatches of a single process.
+N8N_TIMEOUT = 5
+N8N_POOL_MAXSIZE = int(os.getenv("N8N_POOL_MAXSIZE", 10))
+N8N_RETRIES = int(os.getenv("N8N_RETRIES", 2))
+N8N_RETRY_BACKOFF = 0.5
+
+# Maximum number of 5-card pulls a single gacha roll request may perform
+GATCHA_MAX_ROLLS_PER_REQUEST = 10
+
+# Encoded reference images kept in memory between generations (per worker).
+# Set REFERENCE_IMAGE_CACHE_ALIAS to a CACHES alias to share them between workers.
+REFERENCE_IMAGE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+REFERENCE_IMAGE_CACHE_ALIAS = os.getenv("REFERENCE_IMAGE_CACHE_ALIAS")
+
+# How reference images reach the generation workflow: "base64" inlines them in the
+# JSON body, "url" sends signed links N8N downloads from N8N_MEDIA_BASE_URL
+# (defaults to the callback URL's origin).
+N8N_REFERENCE_IMAGE_TRANSPORT = os.getenv("N8N_REFERENCE_IMAGE_TRANSPORT", "base64")
+N8N_MEDIA_BASE_URL = os.getenv("N8N_MEDIA_BASE_URL")
+REFERENCE_MEDIA_URL_MAX_AGE = 60 * 60
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -236,6 +258,43 @@ LOGGING = {
     },
 }
 
+# Cache
+# Shared cache used for catalog versioning (e.g. the compiled gacha drop table).
+# It must be shared by every web and Celery worker, otherwise invalidations stay
+# local to the process that wrote; Redis is already required by Celery.
+# CACHE_URL=locmem:// selects a per-process cache (single process only).
+CACHE_URL = os.getenv("CACHE_URL", "redis://redis:6379/1")
+if CACHE_URL.startswith("locmem://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+
+# Lifetime of cache version tokens (seconds), a backstop should an invalidation
+# be missed: expiry only causes a rebuild.
+CACHE_VERSION_TIMEOUT = int(os.getenv("CACHE_VERSION_TIMEOUT", 300))
+
+# Server-side cache of catalog list responses (seconds, 0 disables it).
+# Entries are keyed on model versions, so writes invalidate them immediately.
+CATALOG_RESPONSE_CACHE_TIMEOUT = int(os.getenv("CATALOG_RESPONSE_CACHE_TIMEOUT", 0))
+CATALOG_RESPONSE_CACHE_ALIAS = "default"
+
+# Card art renditions served as srcset candidates (1x/2x/3x of a 150px grid cell).
+# Formats Pillow can't encode in this build are skipped.
+IMAGE_RENDITION_WIDTHS = (150, 300, 600)
+IMAGE_RENDITION_FORMATS = [
+    f.strip() for f in os.getenv("IMAGE_RENDITION_FORMATS", "webp").split(",") if f.strip()
+]
+IMAGE_RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", 75))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
@@ -244,6 +303,13 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# Derive tamagotchi mood decay on read instead of persisting it every 10 minutes
+TAMAGOTCHI_LAZY_DECAY = os.getenv("TAMAGOTCHI_LAZY_DECAY", "false").lower() == "true"
+
+# Cached state -> URL map of each character's companion images (seconds).
+# CompanionImage writes drop the entry immediately.
+COMPANION_IMAGE_CACHE_TIMEOUT = int(os.getenv("COMPANION_IMAGE_CACHE_TIMEOUT", 3600))
+
 # Celery Beat Schedule
 from celery.schedules import crontab
 
@@ -1,34 +1,39 @@
 from rest_framework import viewsets, filters, permissions
 from django_filters.rest_framework import DjangoFilterBackend
 
+from gatchalife.versioning import CachedListMixin, VersionedConditionalMixin
+
 from .models import Rarity, Style, Theme
 from .serializers import RaritySerializer, StyleSerializer, ThemeSerializer
 
 
-class RarityViewSet(viewsets.ModelViewSet):
+class RarityViewSet(VersionedConditionalMixin, CachedListMixin, viewsets.ModelViewSet):
     queryset = Rarity.objects.all()
     serializer_class = RaritySerializer
     permission_classes = [permissions.AllowAny]
+    cached_models = (Rarity,)
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["id", "name"]
     search_fields = ["name"]
 
 
-class StyleViewSet(viewsets.ModelViewSet):
+class StyleViewSet(VersionedConditionalMixin, CachedListMixin, viewsets.ModelViewSet):
     queryset = Style.objects.all()
     serializer_class = StyleSerializer
     permission_classes = [permissions.AllowAny]
+    cached_models = (Style, Rarity)
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["id", "name", "rarity__id", "rarity__name"]
     search_fields = ["name", "rarity__name"]
 
 
-class ThemeViewSet(viewsets.ModelViewSet):
+class ThemeViewSet(VersionedConditionalMixin, CachedListMixin, viewsets.ModelViewSet):
     queryset = Theme.objects.all()
     serializer_class = ThemeSerializer
     permission_classes = [permissions.AllowAny]
+    cached_models = (Theme,)
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["id", "name", "category", "ambiance"]
@@ -10,3 +10,11 @@ DATABASES = {
         "NAME": BASE_DIR / "test_ticktick.sqlite3",
     }
 }
+
+CELERY_TASK_ALWAYS_EAGER = True
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
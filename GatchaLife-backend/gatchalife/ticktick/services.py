@@ -80,10 +80,11 @@ def process_completed_task(task_id, title, raw_tags, user):
     # 5. Tamagotchi Mood Bonus
     tamagotchi_bonus_multiplier = 1.0
     from gatchalife.gamification.models import ActiveTamagotchi
+    from gatchalife.gamification.mood import current_mood
 
     pet = ActiveTamagotchi.objects.filter(player=player).first()
 
-    if pet and pet.mood >= 60:
+    if pet and current_mood(pet) >= 60:
         tamagotchi_bonus_multiplier = 1.3  # +30% coins if happy/neutral+
 
     # Calcul Final
@@ -140,11 +141,13 @@ def process_completed_task(task_id, title, raw_tags, user):
     # --- TAMAGOTCHI HOOK ---
     try:
         from gatchalife.gamification.models import ActiveTamagotchi
+        from gatchalife.gamification.mood import settle_mood
 
         # Try to get the user's active pet
         # We use filter().first() to avoid crash if not exists
         pet = ActiveTamagotchi.objects.filter(player=player).first()
         if pet:
+            settle_mood(pet)
             # Increase mood by 5, cap at 100
             old_mood = pet.mood
             pet.mood = min(100.0, pet.mood + 5.0)
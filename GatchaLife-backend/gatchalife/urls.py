@@ -13,7 +13,7 @@ from gatchalife.character.views import (
     SeriesViewSet,
 )
 
-from gatchalife.generated_image.views import GeneratedImageViewSet
+from gatchalife.generated_image.views import GeneratedImageViewSet, ReferenceMediaView
 
 from gatchalife.style.views import StyleViewSet, RarityViewSet, ThemeViewSet
 
@@ -40,13 +40,18 @@ router.register(r'styles', StyleViewSet)               # /api/styles/
 router.register(r'rarities', RarityViewSet)           # /api/rarities/
 router.register(r'themes', ThemeViewSet)               # /api/themes/
 
-from gatchalife.workflow_engine.views import N8NCallbackView
+from gatchalife.workflow_engine.views import N8NCallbackView, AsyncJobViewSet
+from gatchalife.versioning import ResponseCacheStatsView
+
+router.register(r'jobs', AsyncJobViewSet)               # /api/jobs/
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("gamification/", include("gatchalife.gamification.urls")),
     path("ticktick/", include("gatchalife.ticktick.urls")),
     path("webhooks/n8n/callback/", N8NCallbackView.as_view(), name="n8n-callback"),
+    path("webhooks/n8n/media/<str:token>/", ReferenceMediaView.as_view(), name="reference-media"),
+    path("cache-stats/", ResponseCacheStatsView.as_view(), name="response-cache-stats"),
     path("", include(router.urls)),
     path(
         "apidocs.<format>/", schema_view.without_ui(cache_timeout=0), name="schema-json"
@@ -0,0 +1,187 @@
+"""
+Version counters for rarely-changing read endpoints.
+
+Each scope (e.g. "catalog") has a token in the shared Django cache that is bumped
+on every write to the models it covers. The token is the bump time in whole
+seconds, strictly increasing, so it gives both a strong ETag and a Last-Modified
+date. VersionedConditionalMixin answers conditional GETs with 304 before any
+query or serialization happens.
+
+CachedListMixin additionally keeps serialized list responses in a Django cache
+(opt-in through CATALOG_RESPONSE_CACHE_TIMEOUT), keyed on the versions of the
+models a viewset serializes, so a write only invalidates the lists it affects.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+CATALOG = "catalog"
+COLLECTION = "collection"
+
+
+def _version_key(scope):
+    return f"gatchalife:version:{scope}"
+
+
+def _version_timeout():
+    # Finite, so a missed bump is recovered from (expiry only changes the ETag)
+    return getattr(settings, "CACHE_VERSION_TIMEOUT", 300)
+
+
+def get_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        cache.add(_version_key(scope), math.ceil(time.time()), timeout=_version_timeout())
+        version = cache.get(_version_key(scope))
+    return version
+
+
+def bump_version(scope):
+    # Whole seconds, as Last-Modified/If-Modified-Since can't carry more: every
+    # bump moves to a later second, even for writes within the same second or
+    # if clocks of two workers disagree slightly.
+    current = cache.get(_version_key(scope)) or 0
+    cache.set(
+        _version_key(scope),
+        max(math.ceil(time.time()), current + 1),
+        timeout=_version_timeout(),
+    )
+
+
+def model_scope(model):
+    return f"model:{model._meta.label_lower}"
+
+
+def connect_version_signals(scope, models):
+    def bump(sender, **kwargs):
+        bump_version(scope)
+
+    for model in models:
+        post_save.connect(
+            bump, sender=model, weak=False, dispatch_uid=f"version_{scope}_save_{model.__name__}"
+        )
+        post_delete.connect(
+            bump, sender=model, weak=False, dispatch_uid=f"version_{scope}_delete_{model.__name__}"
+        )
+
+
+class VersionedConditionalMixin:
+    """
+    Adds ETag/Last-Modified to list and retrieve responses of a viewset and
+    short-circuits to 304 Not Modified when the client's copy is current.
+    """
+
+    version_scopes = (CATALOG,)
+
+    def get_version_scopes(self, request):
+        return self.version_scopes
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        scopes = self.get_version_scopes(request)
+        if not scopes:
+            return handler(request, *args, **kwargs)
+
+        versions = [get_version(scope) for scope in scopes]
+        fingerprint = "|".join(
+            [*(repr(v) for v in versions), request.get_full_path(), request.META.get("HTTP_ACCEPT", "")]
+        )
+        etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+        last_modified = math.ceil(max(versions))
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+RESPONSE_CACHE_STATS_KEY = "gatchalife:response_cache:stats:{name}:{outcome}"
+
+
+def _count(name, outcome):
+    key = RESPONSE_CACHE_STATS_KEY.format(name=name, outcome=outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_response_cache_stats(names):
+    stats = {}
+    for name in names:
+        hits = cache.get(RESPONSE_CACHE_STATS_KEY.format(name=name, outcome="hit"), 0)
+        misses = cache.get(RESPONSE_CACHE_STATS_KEY.format(name=name, outcome="miss"), 0)
+        stats[name] = {"hits": hits, "misses": misses}
+    return stats
+
+
+class CachedListMixin:
+    """
+    Caches the serialized data of list responses. `cached_models` lists every
+    model the list's serializer (or filters) read; a write to any of them bumps
+    its model scope and thereby changes the cache key.
+    Responses carry X-Cache: HIT/MISS; counters are served by ResponseCacheStatsView.
+    """
+
+    cached_models = ()
+
+    def list(self, request, *args, **kwargs):
+        timeout = getattr(settings, "CATALOG_RESPONSE_CACHE_TIMEOUT", 0)
+        if not timeout:
+            return super().list(request, *args, **kwargs)
+
+        name = self.basename
+        response_cache = caches[getattr(settings, "CATALOG_RESPONSE_CACHE_ALIAS", "default")]
+        versions = [get_version(model_scope(model)) for model in self.cached_models]
+        fingerprint = "|".join(
+            [*(repr(v) for v in versions), request.get_host(), request.get_full_path()]
+        )
+        key = f"gatchalife:response_cache:{name}:{hashlib.md5(fingerprint.encode()).hexdigest()}"
+
+        data = response_cache.get(key)
+        if data is not None:
+            _count(name, "hit")
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        _count(name, "miss")
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data, timeout=timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class ResponseCacheStatsView(APIView):
+    """
+    Hit/miss counters of the cached catalog lists per viewset basename,
+    e.g. {"character": {"hits": 3, "misses": 1}, ...}.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    cached_list_names = ("character", "charactervariant", "rarity", "style", "theme")
+
+    def get(self, request):
+        return Response(get_response_cache_stats(self.cached_list_names))
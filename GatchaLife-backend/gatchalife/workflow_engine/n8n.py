@@ -0,0 +1,121 @@
+"""
+Shared HTTP client for N8N webhook calls.
+
+All webhook triggers go through one pooled requests.Session per process so that
+connections to N8N_BASE_URL are kept alive instead of paying a TCP+TLS handshake
+on every call. Connection failures are retried with exponential backoff; anything
+that may have reached N8N is not. Each call's latency is logged and aggregated.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+import requests
+import structlog
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = structlog.get_logger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+_metrics = defaultdict(lambda: {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+_metrics_lock = threading.Lock()
+
+
+def webhook_url(path):
+    base_url = getattr(settings, "N8N_BASE_URL", None)
+    webhook_path = getattr(settings, "N8N_WORKFLOW_WEBHOOK_PATH", "webhook")
+    return f"{base_url}/{webhook_path}/{path}"
+
+
+def build_session():
+    retries = getattr(settings, "N8N_RETRIES", 2)
+    # Webhooks aren't idempotent: only retry when the request never reached N8N
+    # (connection refused/failed). Read timeouts and 5xx answers are not retried,
+    # the workflow may already be running.
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=getattr(settings, "N8N_RETRY_BACKOFF", 0.5),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    pool_size = getattr(settings, "N8N_POOL_MAXSIZE", 10)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def reset_session():
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _record(name, elapsed_ms, failed):
+    with _metrics_lock:
+        m = _metrics[name]
+        m["calls"] += 1
+        m["errors"] += int(failed)
+        m["total_ms"] += elapsed_ms
+        m["max_ms"] = max(m["max_ms"], elapsed_ms)
+
+
+def get_metrics():
+    """
+    Returns per-webhook call counts, error counts and latency (ms) for this process.
+    """
+    with _metrics_lock:
+        return {
+            name: {**m, "avg_ms": m["total_ms"] / m["calls"] if m["calls"] else 0.0}
+            for name, m in _metrics.items()
+        }
+
+
+def post(url, name="n8n", **kwargs):
+    """
+    POSTs to an N8N webhook through the pooled session.
+    Accepts the same keyword arguments as requests.post; `name` labels the metrics.
+    """
+    kwargs.setdefault("timeout", getattr(settings, "N8N_TIMEOUT", 5))
+
+    start = time.monotonic()
+    failed = True
+    status_code = None
+    try:
+        response = get_session().post(url, **kwargs)
+        status_code = response.status_code
+        failed = status_code >= 500
+        return response
+    finally:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        _record(name, elapsed_ms, failed)
+        logger.info(
+            "n8n_webhook_call",
+            webhook=name,
+            status_code=status_code,
+            duration_ms=round(elapsed_ms, 1),
+        )
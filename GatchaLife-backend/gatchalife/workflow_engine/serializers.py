@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+from .models import AsyncJob
+
+
+class AsyncJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AsyncJob
+        fields = [
+            "id",
+            "job_type",
+            "status",
+            "object_id",
+            "error_message",
+            "created_at",
+            "updated_at",
+        ]
@@ -0,0 +1,67 @@
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+from . import n8n
+
+
+@override_settings(N8N_POOL_MAXSIZE=7, N8N_RETRIES=3)
+class N8NClientTests(SimpleTestCase):
+    def setUp(self):
+        n8n.reset_session()
+        self.addCleanup(n8n.reset_session)
+
+    def test_session_is_shared_and_pooled(self):
+        session = n8n.get_session()
+        self.assertIs(n8n.get_session(), session)
+
+        adapter = session.get_adapter("https://n8n.example.com/webhook/x")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.connect, 3)
+        self.assertEqual(adapter.max_retries.read, 0)
+        self.assertEqual(adapter.max_retries.status, 0)
+
+    @override_settings(N8N_RETRY_BACKOFF=0)
+    def test_read_timeout_is_not_retried(self):
+        # Accepts connections and never answers
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(5)
+        self.addCleanup(server.close)
+        accepted = []
+
+        def accept():
+            server.settimeout(2)
+            try:
+                while True:
+                    accepted.append(server.accept()[0])
+            except OSError:
+                pass
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+
+        url = f"http://127.0.0.1:{server.getsockname()[1]}/webhook/x"
+        with self.assertRaises(requests.exceptions.RequestException):
+            n8n.post(url, name="slow_hook", json={"a": 1}, timeout=0.2)
+        thread.join()
+
+        self.assertEqual(len(accepted), 1)
+        for conn in accepted:
+            conn.close()
+
+    def test_post_records_latency(self):
+        session = MagicMock()
+        session.post.return_value.status_code = 200
+        with patch.object(n8n, "get_session", return_value=session):
+            n8n.post("https://n8n.example.com/webhook/x", name="test_hook", json={"a": 1})
+
+        session.post.assert_called_once_with(
+            "https://n8n.example.com/webhook/x", json={"a": 1}, timeout=5
+        )
+        metrics = n8n.get_metrics()["test_hook"]
+        self.assertEqual(metrics["calls"], 1)
+        self.assertEqual(metrics["errors"], 0)
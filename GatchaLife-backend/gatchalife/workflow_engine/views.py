@@ -1,9 +1,11 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import status, viewsets, permissions
+from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from .models import AsyncJob
 from .registry import JobRegistry
+from .serializers import AsyncJobSerializer
 import logging
 import json
 from django.core.files.uploadedfile import UploadedFile
@@ -11,6 +13,17 @@ from django.core.files.uploadedfile import UploadedFile
 logger = logging.getLogger(__name__)
 
 
+class AsyncJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Lets clients poll the status of jobs returned by async endpoints (e.g. gacha rolls).
+    """
+    queryset = AsyncJob.objects.all()
+    serializer_class = AsyncJobSerializer
+    permission_classes = [permissions.AllowAny]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["job_type", "status"]
+
+
 class N8NCallbackView(APIView):
     """
     Generic callback endpoint for N8N workflows.